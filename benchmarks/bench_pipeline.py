@@ -0,0 +1,124 @@
+# bench_pipeline.py
+"""Time every pipeline stage on synthetic data of growing size.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 100 1000 10000] [--years 12]
+                                           [--workers N] [--work-dir DIR] [--in-memory] [--skip-train]
+
+For each size a synthetic dataset (synth_data.py) is generated once under
+work-dir/companies_<n> and reused by later runs. Then merge, clean, features,
+zscore and train run on it, and their wall time, CPU time and peak memory are
+appended to work-dir/bench_pipeline.csv, so runs from different commits can
+be compared. The stage records of the last run of each size are in
+work-dir/companies_<n>/run_report.json. The Parquet cache and the label
+synonym table are private to work-dir and emptied before every size.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "code_full"))
+sys.path.insert(0, os.path.join(ROOT, "start_of_Ml"))
+
+import matplotlib
+matplotlib.use("Agg")
+
+import excel_cache
+import labels
+import profiling
+from build_features import build_features
+from combine_all import run_merge
+from compute_z_and_target import run_zscore
+from edit_all import run_clean
+from synth_data import FOLDERS, write_dataset
+
+
+def dataset(work_dir, companies, years, workers):
+    """Directory with the synthetic sources for `companies` (generated on first use)."""
+    data_dir = os.path.join(work_dir, f"companies_{companies}")
+    marker = os.path.join(data_dir, f".synth_{years}y")
+    if not os.path.exists(marker):
+        shutil.rmtree(data_dir, ignore_errors=True)
+        t0 = time.perf_counter()
+        write_dataset(data_dir, companies, years, workers=workers)
+        open(marker, "w").close()
+        print(f"  📝 generated {companies} companies in {time.perf_counter() - t0:.1f}s")
+    # outputs of the previous run would turn the next one incremental / stale
+    for name in os.listdir(data_dir):
+        if name not in FOLDERS and not name.startswith(".synth_"):
+            path = os.path.join(data_dir, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    return data_dir
+
+
+def run_stages(data_dir, workers, in_memory, train):
+    """Run the chain; the timings land in profiling.RECORDS."""
+    memory = {} if in_memory else None
+    run_merge(data_dir, workers, memory=memory)
+    merged_all = run_clean(data_dir, memory=memory)
+    features = build_features(merged_all, data_dir, memory=memory)
+    if memory:
+        memory.pop("merged", None)
+    ml_ready = run_zscore(features, memory=memory)
+    if train:
+        from xg_boost_with_eval import run_train
+        with profiling.profile("train") as rec:
+            df = memory["ml_ready"] if memory else excel_cache.read_excel_cached(ml_ready)
+            rec["rows"] = len(df)
+            run_train(df, os.path.join(data_dir, "plots"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--years", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--work-dir", default=os.path.join(ROOT, "benchmarks", "_work"))
+    parser.add_argument("--in-memory", action="store_true", help="hand frames between stages like `pipeline.py all`")
+    parser.add_argument("--skip-train", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    # a private Parquet cache, emptied before every size: the benchmark measures real parsing
+    cache_dir = os.path.join(args.work_dir, "_cache")
+    excel_cache.CACHE_DIR = os.environ["RAHAVARD_CACHE_DIR"] = cache_dir
+    # and a private synonym table, so fuzzy matches neither touch the user's table nor carry over
+    synonyms_file = os.path.join(args.work_dir, "_label_synonyms.json")
+    profiling.enable()
+
+    results = []
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    for companies in args.sizes:
+        print(f"\n===== {companies} companies =====")
+        data_dir = dataset(args.work_dir, companies, args.years, args.workers)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        if os.path.exists(synonyms_file):
+            os.remove(synonyms_file)
+        labels.use_synonym_file(synonyms_file)
+        profiling.RECORDS.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_stages(data_dir, args.workers, args.in_memory, not args.skip_train)
+        profiling.write_report(data_dir)
+
+        for rec in profiling.RECORDS:
+            if rec["company"] is None:
+                results.append({"run": stamp, "companies": companies, "years": args.years,
+                                "workers": args.workers, "in_memory": args.in_memory, "stage": rec["stage"],
+                                "wall_s": rec["wall_s"], "cpu_s": rec["cpu_s"], "peak_rss_mb": rec["peak_rss_mb"]})
+                print(f"  {rec['stage']:<9} {rec['wall_s']:>9.2f}s wall {rec['cpu_s']:>9.2f}s cpu"
+                      f"  {rec['peak_rss_mb']} MB peak")
+
+    out_csv = os.path.join(args.work_dir, "bench_pipeline.csv")
+    pd.DataFrame(results).to_csv(out_csv, mode="a", header=not os.path.exists(out_csv),
+                                 index=False, encoding="utf-8-sig")
+    print(f"\n⏱️ Results appended to: {out_csv}")
+
+
+if __name__ == "__main__":
+    main()
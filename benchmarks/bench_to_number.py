@@ -0,0 +1,67 @@
+# bench_to_number.py
+"""Compare per-cell to_number with the vectorized to_number_frame on Merged_All.xlsx.
+
+Usage: python benchmarks/bench_to_number.py [path/to/Merged_All.xlsx]
+Checks that both give bit-identical float64 results and prints the timings.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "code_full"))
+from excel_cache import read_excel_cached
+from numeric import to_number, to_number_frame, to_number_series
+
+
+def as_bits(values):
+    return np.asarray(values, dtype="float64").view("int64")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "files", "combiend_all", "Merged_All.xlsx")
+    sheets = read_excel_cached(path, sheet_name=None)
+    cells = sum(df.size for df in sheets.values())
+    print(f"📁 {os.path.basename(path)}: {len(sheets)} sheets, {cells} cells")
+
+    t0 = time.perf_counter()
+    scalar = {name: df.map(to_number) for name, df in sheets.items()}
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vector = {name: to_number_frame(df) for name, df in sheets.items()}
+    t_vector = time.perf_counter() - t0
+
+    # all cells of the workbook as one column: the vectorized path at scale
+    pooled = pd.Series(np.concatenate([df.to_numpy(dtype=object).ravel() for df in sheets.values()]), dtype=object)
+    t0 = time.perf_counter()
+    pooled_scalar = pooled.map(to_number)
+    t_pooled_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    pooled_vector = to_number_series(pooled)
+    t_pooled_vector = time.perf_counter() - t0
+
+    mismatches = 0
+    if not np.array_equal(as_bits(pooled_scalar), as_bits(pooled_vector)):
+        mismatches += 1
+        print("  ❌ pooled cells differ")
+    for name in sheets:
+        a, b = scalar[name], vector[name]
+        for pos in range(a.shape[1]):
+            if not np.array_equal(as_bits(a.iloc[:, pos]), as_bits(b.iloc[:, pos])):
+                mismatches += 1
+                print(f"  ❌ {name} / column {pos} differs")
+
+    print(f"per sheet, per-cell: {t_scalar:.3f}s")
+    print(f"per sheet, frame   : {t_vector:.3f}s  ({t_scalar / t_vector:.1f}x)")
+    print(f"pooled, per-cell   : {t_pooled_scalar:.3f}s")
+    print(f"pooled, vectorized : {t_pooled_vector:.3f}s  ({t_pooled_scalar / t_pooled_vector:.1f}x)")
+    print("✅ bit-identical" if mismatches == 0 else f"❌ {mismatches} columns differ")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
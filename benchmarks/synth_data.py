@@ -0,0 +1,219 @@
+# synth_data.py
+"""Synthetic Rahavard statement workbooks for benchmarks.
+
+Writes <out_dir>/{ترازنامه, سود و زیان, نسبت های مالی, گردش وجوه نقد}/"<company> <folder>.xlsx"
+in the shape of files/main_data: one "ag-grid" sheet, "سال مالی" header row
+with one period column per fiscal year, the five report-metadata rows, then
+the statement rows with the real Persian labels. A share of the figures
+(text_ratio) is written as text the way copied reports look: Persian digits,
+"٬" thousands separators and negatives in parentheses.
+
+Usage: python benchmarks/synth_data.py <out_dir> [companies] [years] [workers]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+FOLDERS = ["ترازنامه", "سود و زیان", "نسبت های مالی", "گردش وجوه نقد"]
+FIRST_YEAR = 1390
+ASCII_TO_PERSIAN = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+
+META_LABELS = ["نوع گزارش", "نوع داده", "تجدید ارائه", "حسابرسی", "تاریخ"]
+
+BALANCE_LABELS = [
+    "تصویر اطلاعیه",
+    "جمع دارایی‌های جاری",
+    "جمع دارایی‌های غیرجاری",
+    "جمع کل دارایی‌ها",
+    "جمع بدهی‌های جاری",
+    "جمع بدهی‌های غیر جاری",
+    "جمع کل بدهی‌ها",
+    "جمع حقوق صاحبان سهام",
+    "جمع کل بدهی‌ها و حقوق صاحبان سهام",
+    "جمع حقوق صاحبان سهام مصوب (در مجمع)",
+]
+
+INCOME_LABELS = [
+    "تصویر اطلاعیه",
+    "جمع درآمدها",
+    "بهای تمام شده کالای فروش رفته",
+    "سود ناویژه",
+    "سود (زیان) عملیاتی",
+    "هزینه‌های مالی",
+    "سود (زیان) تسعیر تسهیلات ارزی دریافتی",
+    "درآمد حاصل از سرمایه گذاری",
+    "خالص سایر درآمدها (هزینه‌ها)",
+    "سود(زیان)فروش دارائیهای زیستی مولد",
+    "اقلام غیر مترقبه یا اثرات انباشته تغییر در اصول و روشهای حسابداری و مالیات",
+    "سود قبل از کسر مالیات",
+    "مالیات",
+    "مالیات سال قبل",
+    "سهم اقلیت از سود سال جاری",
+    "سود (زیان) ویژه پس از کسر مالیات",
+    "سود قابل تخصیص",
+    "سود و زیان انباشته در پایان دوره",
+    "سرمایه",
+    "EPS خالص",
+]
+
+CASH_FLOW_LABELS = [
+    "تصویر اطلاعیه",
+    "جریان خالص ورود (خروج) نقد حاصل از فعالیت های عملیاتی",
+    "جريان خالص ورود (خروج) نقد حاصل از فعاليتهای سرمایه گذاری",
+    "جريان خالص ورود (خروج) نقد قبل از فعالیت های تامین مالی",
+    "جريان خالص ورود (خروج) نقد حاصل از فعالیت های تامين مالی",
+    "خالص افزايش (کاهش) در موجودی نقد",
+    "مانده موجودی نقد در ابتدای دوره",
+    "تاثير تغييرات نرخ ارز",
+    "مانده موجودی نقد در پايان دوره",
+    "معاملات غیرنقدی",
+]
+
+# ratio sheet: section titles (empty rows) and ratios in percent / times
+RATIO_LABELS = [
+    "سودآوری", "سود خالص به فروش", "سود ناخالص به فروش", "حاشیه سود عملیاتی",
+    "بازده دارایی‌ها ROA", "بازدهی سرمایه ROE",
+    "نقدینگی", "نسبت جاری", "نسبت آنی", "سرمایه در گردش خالص",
+    "کارایی", "گردش موجودی کالا", "گردش دارایی‌های ثابت", "گردش مجموع دارایی‌ها",
+    "اهرمی", "نسبت بدهی", "نسبت بدهی به ارزش ویژه", "نسبت مالکانه",
+]
+RATIO_SECTIONS = {"سودآوری", "نقدینگی", "کارایی", "اهرمی"}
+
+
+def company_names(n):
+    """Space-free names (the merge step takes everything before the first space)."""
+    width = len(str(n))
+    return [f"سنتز{str(i).zfill(width).translate(ASCII_TO_PERSIAN)}" for i in range(1, n + 1)]
+
+
+def as_text(value):
+    """A figure as it appears in copied reports: Persian digits, ٬ separators, (negatives)."""
+    text = f"{abs(int(value)):,}".replace(",", "٬").translate(ASCII_TO_PERSIAN)
+    return f"({text})" if value < 0 else text
+
+
+def statement_values(rng, years):
+    """Consistent yearly figures (million rials) for one company."""
+    growth = np.cumprod(1 + rng.normal(0.25, 0.15, years).clip(-0.3, 1.0))
+    total_assets = (rng.uniform(1e5, 5e7) * growth).round()
+    current_assets = (total_assets * rng.uniform(0.3, 0.8, years)).round()
+    current_liab = (current_assets * rng.uniform(0.4, 1.3, years)).round()
+    total_liab = (current_liab + total_assets * rng.uniform(0.0, 0.25, years)).round()
+    equity = total_assets - total_liab
+    sales = (total_assets * rng.uniform(0.4, 1.6, years)).round()
+    cogs = (sales * rng.uniform(0.55, 0.95, years)).round()
+    gross = sales - cogs
+    ebit = (gross - sales * rng.uniform(0.02, 0.12, years)).round()
+    finance = (total_liab * rng.uniform(0.0, 0.05, years)).round()
+    pretax = ebit - finance
+    tax = (pretax.clip(min=0) * 0.25).round()
+    net = pretax - tax
+    capital = np.full(years, float(round(total_assets[0] * 0.2)))
+    retained = np.cumsum(net * 0.5).round()
+
+    balance = [current_assets, total_assets - current_assets, total_assets, current_liab,
+               total_liab - current_liab, total_liab, equity, total_assets, equity]
+    income = [sales, cogs, gross, ebit, -finance, np.zeros(years), np.zeros(years),
+              (sales * rng.uniform(-0.01, 0.02, years)).round(), np.zeros(years), np.zeros(years),
+              pretax, -tax, np.zeros(years), np.zeros(years), net, net + retained, retained,
+              capital, (net / capital * 1000).round()]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = [net / sales * 100, gross / sales * 100, ebit / sales * 100,
+                  net / total_assets * 100, net / equity * 100,
+                  current_assets / current_liab, (current_assets * 0.7) / current_liab,
+                  current_assets - current_liab,
+                  cogs / (current_assets * 0.3), sales / (total_assets - current_assets), sales / total_assets,
+                  total_liab / total_assets * 100, total_liab / equity, equity / total_assets * 100]
+
+    operating = (net + sales * rng.normal(0.0, 0.05, years)).round()
+    investing = -(total_assets * rng.uniform(0.0, 0.08, years)).round()
+    financing = (-operating * rng.uniform(0.2, 0.9, years) - investing * rng.uniform(0.0, 1.0, years)).round()
+    change = operating + investing + financing
+    opening = np.concatenate([[float(round(current_assets[0] * 0.05))], np.zeros(years - 1)])
+    for i in range(1, years):
+        opening[i] = opening[i - 1] + change[i - 1]
+    cash_flow = [operating, investing, operating + investing, financing, change, opening,
+                 np.zeros(years), opening + change, np.zeros(years)]
+    return balance, income, [np.round(r, 3) for r in ratios], cash_flow
+
+
+def statement_frame(rng, years, labels, rows, text_ratio, sections=()):
+    """One sheet as a header=None frame: header row, metadata rows, then `labels`."""
+    periods = [f"{FIRST_YEAR + i}/12/29" for i in range(years)]
+    published = [f"{FIRST_YEAR + i + 1}/{rng.integers(1, 7)}/{rng.integers(1, 30)}" for i in range(years)]
+    meta = [["مجمع (سالانه)"] * years,
+            ["اصلی"] * years,
+            list(rng.choice(["✔️", "✖️"], years)),
+            list(rng.choice(["✔️", "✖️"], years)),
+            published]
+    grid = [["سال مالی"] + periods] + [[label] + row for label, row in zip(META_LABELS, meta)]
+
+    values = iter(rows)
+    for label in labels:
+        if label == "تصویر اطلاعیه":
+            grid.append([label] + [f"https://rahavard365.com/reports/{rng.integers(100000, 999999)}"
+                                   for _ in range(years)])
+        elif label in sections:
+            grid.append([label] + [None] * years)
+        else:
+            row = []
+            for v in next(values):
+                if not np.isfinite(v):
+                    row.append(None)
+                elif float(v).is_integer() and rng.random() < text_ratio:
+                    row.append(as_text(v))
+                else:
+                    row.append(int(v) if float(v).is_integer() else float(v))
+            grid.append([label] + row)
+    return pd.DataFrame(grid)
+
+
+def write_company(out_dir, company, years, seed, text_ratio):
+    rng = np.random.default_rng(seed)
+    balance, income, ratios, cash_flow = statement_values(rng, years)
+    frames = {
+        "ترازنامه": statement_frame(rng, years, BALANCE_LABELS, balance, text_ratio),
+        "سود و زیان": statement_frame(rng, years, INCOME_LABELS, income, text_ratio),
+        "نسبت های مالی": statement_frame(rng, years, RATIO_LABELS, ratios, 0.0, RATIO_SECTIONS),
+        "گردش وجوه نقد": statement_frame(rng, years, CASH_FLOW_LABELS, cash_flow, text_ratio),
+    }
+    for folder, frame in frames.items():
+        path = os.path.join(out_dir, folder, f"{company} {folder}.xlsx")
+        frame.to_excel(path, sheet_name="ag-grid", header=False, index=False)
+    return company
+
+
+def write_dataset(out_dir, companies, years=12, seed=0, text_ratio=0.1, workers=1):
+    """Write `companies` synthetic companies into out_dir; returns their names."""
+    for folder in FOLDERS:
+        os.makedirs(os.path.join(out_dir, folder), exist_ok=True)
+    names = company_names(companies)
+    jobs = [(out_dir, name, years, seed * 1_000_003 + i, text_ratio) for i, name in enumerate(names)]
+    if workers <= 1:
+        for job in jobs:
+            write_company(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(write_company, *zip(*jobs), chunksize=16))
+    return names
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    out_dir = sys.argv[1]
+    companies = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    years = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else (os.cpu_count() or 1)
+    t0 = time.perf_counter()
+    write_dataset(out_dir, companies, years, workers=workers)
+    print(f"✅ {companies} companies × {years} years written to {out_dir} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# altman.py
+"""Vectorized Altman ratios (X1..X5), Z-score, risk zone and cash-flow ratios over whole columns."""
+import numpy as np
+import pandas as pd
+
+# X = numerator / denominator (X1's numerator is CurrentAssets - CurrentLiabilities)
+X_DENOMINATORS = {
+    "X1": "TotalAssets",
+    "X2": "TotalAssets",
+    "X3": "TotalAssets",
+    "X4": "TotalLiabilities",
+    "X5": "TotalAssets",
+}
+X_COLS = list(X_DENOMINATORS)
+Z_WEIGHTS = {"X1": 1.2, "X2": 1.4, "X3": 3.3, "X4": 0.6, "X5": 1.0}
+
+# cash-flow ratio = numerator / denominator
+CASH_FLOW_RATIOS = {
+    "OCF_to_TotalLiabilities": ("OperatingCashFlow", "TotalLiabilities"),
+    "OCF_to_CurrentLiabilities": ("OperatingCashFlow", "CurrentLiabilities"),
+    "OCF_to_Sales": ("OperatingCashFlow", "Sales"),
+    "Cash_to_TotalAssets": ("EndingCash", "TotalAssets"),
+}
+CASH_FLOW_COLS = list(CASH_FLOW_RATIOS)
+
+# Altman cut-offs
+SAFE_ABOVE = 2.99
+DISTRESS_BELOW = 1.81
+
+
+def _column(df, name):
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce').astype('float64')
+    return pd.Series(np.nan, index=df.index)
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise division that gives NaN where the denominator is missing or zero."""
+    numerator = np.asarray(numerator, dtype='float64')
+    denominator = np.asarray(denominator, dtype='float64')
+    ok = ~np.isnan(denominator) & (denominator != 0)
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=ok)
+    return out
+
+
+def compute_ratios(df):
+    """X1..X5 from the base columns of a features frame (missing columns count as NaN)."""
+    numerators = {
+        "X1": _column(df, "CurrentAssets") - _column(df, "CurrentLiabilities"),
+        "X2": _column(df, "RetainedEarnings"),
+        "X3": _column(df, "EBIT"),
+        "X4": _column(df, "Equity"),
+        "X5": _column(df, "Sales"),
+    }
+    return pd.DataFrame(
+        {x: safe_divide(numerators[x], _column(df, X_DENOMINATORS[x])) for x in X_COLS},
+        index=df.index)
+
+
+def compute_cash_flow_ratios(df):
+    """Cash-flow ratios of a features frame (NaN where the statement or a denominator is missing)."""
+    return pd.DataFrame(
+        {col: safe_divide(_column(df, num), _column(df, den)) for col, (num, den) in CASH_FLOW_RATIOS.items()},
+        index=df.index)
+
+
+def altman_z(x):
+    """Z = 1.2*X1 + 1.4*X2 + 3.3*X3 + 0.6*X4 + 1.0*X5 (NaN if any X is NaN)."""
+    return (Z_WEIGHTS["X1"] * x["X1"] + Z_WEIGHTS["X2"] * x["X2"] + Z_WEIGHTS["X3"] * x["X3"]
+            + Z_WEIGHTS["X4"] * x["X4"] + Z_WEIGHTS["X5"] * x["X5"])
+
+
+def risk_zone(z):
+    """Safe / Grey / Distress zone per Z value (None where Z is NaN)."""
+    z = pd.Series(z, dtype='float64')
+    zone = np.select([z > SAFE_ABOVE, z >= DISTRESS_BELOW, z.notna()],
+                     ["Safe Zone", "Grey Zone", "Distress Zone"], default=None)
+    return pd.Series(zone, index=z.index, dtype=object)
+
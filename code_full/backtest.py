@@ -0,0 +1,176 @@
+# backtest.py
+"""Walk-forward backtest of the Z_next model: train on years ≤ t, predict t+1.
+
+A row of the ML-ready table holds the features of year t and its target
+Z_next (the Altman Z of t+1). For every test year the model is trained on
+all rows of the earlier years and scores the rows of that year, so no
+information from the test year reaches training, unlike the random or
+company-grouped splits of the trainers.
+
+Training windows only grow, so a booster is carried from one window to the
+next: the first window of a run fits n_estimators trees, each later window
+adds step_rounds trees on its (larger) training set with xgb_model= instead
+of refitting. The preprocessing (preprocess.py) is fitted on that first
+window's training rows and kept, so the carried trees keep seeing the same
+feature scale.
+
+By default all test years form one chain, which trains window after window
+with every core given to xgboost. chain_years=N starts a fresh chain every N
+test years instead; the chains then train side by side in threads
+(model_cv.fold_threads sizes them). The chains depend only on chain_years,
+never on the number of cores, so the report is the same on every machine.
+With warm_start=False every window is a fresh fit (chains of one year).
+The settings are written to the report's Settings sheet.
+
+    python code_full/pipeline.py backtest <..._ML_ready.xlsx> [-o Backtest.xlsx] [--min-train-years 3]
+                                          [--chain-years N] [--refit]
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from excel_cache import read_excel_cached
+from model_cv import booster_params, fold_threads
+from preprocess import DEFAULT_SPEC, fit_transform_cached, split_frame
+from profiling import current, profiled
+from xlsx_writer import SIGN_RULES, add_color_rules
+
+DEFAULT_PARAMS = dict(
+    n_estimators=400,
+    learning_rate=0.05,
+    max_depth=6,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    random_state=42,
+    objective='reg:squarederror'
+)
+POOLED = "ALL"
+
+
+# ---------- Windows ----------
+def fiscal_years(df):
+    """Numeric fiscal year of every row (Year_num, else Year)."""
+    year = df['Year_num'] if 'Year_num' in df.columns else df['Year']
+    return pd.to_numeric(year, errors='coerce').to_numpy()
+
+
+def test_years(years, min_train_years=3):
+    """Years that have at least min_train_years earlier years to train on."""
+    found = np.unique(years[~np.isnan(years)])
+    return [int(y) for y in found[min_train_years:]]
+
+
+def chains(years, chain_years=None, warm_start=True):
+    """Consecutive test years trained as one warm-started chain each (independent of cores)."""
+    size = 1 if not warm_start else (chain_years or len(years))
+    return [list(years[i:i + size]) for i in range(0, len(years), size)]
+
+
+# ---------- One run of consecutive windows ----------
+def _run_segment(X, y, year, segment, params, step_rounds, spec, threads):
+    native, rounds = booster_params(params)
+    native["nthread"] = threads
+    prep = booster = None
+    results = []
+    for test_year in segment:
+        train, test = year < test_year, year == test_year
+        if booster is None:
+            prep, X_train, X_test = fit_transform_cached(X.loc[train], X.loc[test], spec)
+            booster = xgb.train(native, xgb.DMatrix(X_train, label=y[train]), num_boost_round=rounds)
+        else:
+            X_train, X_test = prep.transform(X.loc[train]), prep.transform(X.loc[test])
+            booster = xgb.train(native, xgb.DMatrix(X_train, label=y[train]),
+                                num_boost_round=step_rounds, xgb_model=booster)
+        pred = booster.predict(xgb.DMatrix(X_test))
+        results.append((segment[0], test_year, int(train.sum()), booster.num_boosted_rounds(),
+                        np.flatnonzero(test), pred))
+    return results
+
+
+def _metrics(y_true, y_pred):
+    return {
+        "R2": r2_score(y_true, y_pred) if len(y_true) > 1 else np.nan,
+        "RMSE": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "MAE": mean_absolute_error(y_true, y_pred),
+    }
+
+
+# ---------- Backtest ----------
+def backtest(df, params=None, min_train_years=3, step_rounds=50, warm_start=True, cores=None,
+             spec=DEFAULT_SPEC, chain_years=None):
+    """(per-year metrics, predictions) of a walk-forward backtest on an ML-ready frame.
+
+    Per-year rows: test Year, first year of its chain, training/test rows,
+    trees in the model, R², RMSE, MAE, plus a pooled ALL row over every
+    prediction. cores only changes the speed, never the numbers.
+    """
+    year = fiscal_years(df)
+    keep = ~np.isnan(year)
+    df, year = df.loc[keep].reset_index(drop=True), year[keep]
+    X, y, _ = split_frame(df)
+    y = y.to_numpy(dtype="float64")
+    years = test_years(year, min_train_years)
+    if not years:
+        raise ValueError(f"Need more than {min_train_years} fiscal years for a walk-forward backtest")
+
+    segments = chains(years, chain_years, warm_start)
+    parallel, threads = fold_threads(len(segments), cores)
+    params = DEFAULT_PARAMS if params is None else params
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        runs = list(executor.map(
+            lambda seg: _run_segment(X, y, year, seg, params, step_rounds, spec, threads), segments))
+
+    rows, preds = [], []
+    for start, test_year, n_train, n_trees, test_idx, pred in (r for run in runs for r in run):
+        rows.append({"Year": test_year, "Chain_start": start, "Train_rows": n_train, "Test_rows": len(test_idx),
+                     "Trees": n_trees, **_metrics(y[test_idx], pred)})
+        preds.append(pd.DataFrame({
+            "Company": df['Company'].to_numpy()[test_idx] if 'Company' in df.columns else test_idx,
+            "Year": test_year, "Z_next": y[test_idx], "Z_next_pred": pred}))
+    predictions = pd.concat(preds, ignore_index=True)
+    pooled = {"Year": POOLED, "Chain_start": np.nan, "Train_rows": np.nan, "Test_rows": len(predictions), "Trees": np.nan,
+              **_metrics(predictions["Z_next"], predictions["Z_next_pred"])}
+    per_year = pd.DataFrame(rows + [pooled]).astype({"Chain_start": "Int64", "Train_rows": "Int64", "Trees": "Int64"})
+    return per_year, predictions
+
+
+@profiled("backtest")
+def run_backtest(df, output_file, params=None, min_train_years=3, step_rounds=50, warm_start=True,
+                 cores=None, chain_years=None):
+    """Backtest an ML-ready frame and write Per_Year, Predictions and Settings sheets to output_file."""
+    params = DEFAULT_PARAMS if params is None else params
+    per_year, predictions = backtest(df, params, min_train_years, step_rounds, warm_start, cores,
+                                     chain_years=chain_years)
+    settings = pd.DataFrame({"Setting": ["warm_start", "chain_years", "step_rounds", "min_train_years", "params"],
+                             "Value": [str(warm_start), str(chain_years or "all (one chain)") if warm_start else "1",
+                                       str(step_rounds), str(min_train_years), str(params)]})
+    current().update(rows=len(df), windows=len(per_year) - 1)
+    print(per_year.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    with pd.ExcelWriter(output_file) as writer:
+        per_year.to_excel(writer, sheet_name="Per_Year", index=False)
+        predictions.to_excel(writer, sheet_name="Predictions", index=False)
+        settings.to_excel(writer, sheet_name="Settings", index=False)
+        r2_col = per_year.columns.get_loc("R2")
+        add_color_rules(writer, "Per_Year", 1, r2_col, len(per_year), r2_col, SIGN_RULES)
+    print("✅ Walk-forward backtest saved →", output_file)
+    return output_file
+
+
+def main():
+    file_path = input("Enter the ML-ready file (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
+    if not os.path.exists(file_path):
+        print("File not found. Exiting.")
+        return
+    df = read_excel_cached(file_path)
+    output_file = input("Output file [Backtest.xlsx]: ").strip() \
+        or os.path.join(os.path.dirname(os.path.abspath(file_path)), "Backtest.xlsx")
+    run_backtest(df, output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,58 +3,18 @@ import os
 import pandas as pd
 import re
 
-# ---------- Utility functions ----------
-# map Persian/Arabic digits to ASCII digits
-PERSIAN_DIGITS = {ord(x): ord(y) for x, y in zip(
-    "۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")}
-
-def normalize_text(s):
-    if pd.isna(s):
-        return s
-    s = str(s)
-    # normalize arabic y/k to persian if present
-    s = s.replace('ي', 'ی').replace('ك', 'ک')
-    # remove zero-width and non-printable
-    s = re.sub(r'[\u200c\u200b\u200e\u200f]', '', s)
-    return s.strip()
-
-def to_number(x):
-    """Convert a cell to float if possible: handle Persian digits, commas, parentheses for negatives."""
-    if pd.isna(x):
-        return float('nan')
-    s = str(x).strip()
-    if s == '':
-        return float('nan')
-    # replace Persian/Arabic digits
-    s = s.translate(PERSIAN_DIGITS)
-    # remove currency symbols or non-numeric letters
-    s = s.replace(',', '').replace('٬', '')  # comma variants
-    s = s.replace(' ', '')
-    # handle parentheses negative e.g. (123) => -123
-    if re.match(r'^\(.*\)$', s):
-        s = '-' + s[1:-1]
-    # if s contains non-digit except - and ., coerce
-    try:
-        return pd.to_numeric(s, errors='coerce')
-    except:
-        return float('nan')
+from altman import CASH_FLOW_COLS, X_COLS, compute_cash_flow_ratios, compute_ratios
+from excel_cache import read_excel_cached, read_rows_cached
+from labels import normalize_text, resolve_rows
+from manifest import forget_missing, frame_digest, load_manifest, record_stage, save_manifest, stage_entry
+from numeric import to_number_frame
+from profiling import current, profile, profiled, write_report
+from tidy_store import companies_in, pivot_company, read_tidy
 
+# ---------- Utility functions ----------
 def find_row_index(df_index, target_phrase):
     """Find an index in df_index that matches target_phrase robustly (exact then substring)."""
-    target = normalize_text(target_phrase)
-    # exact match
-    for idx in df_index:
-        if normalize_text(idx) == target:
-            return idx
-    # substring match
-    for idx in df_index:
-        if target in normalize_text(idx):
-            return idx
-    # try reverse: index contained in target (rare)
-    for idx in df_index:
-        if normalize_text(idx) in target:
-            return idx
-    return None
+    return resolve_rows(df_index, {"target": target_phrase})["target"]
 
 # ---------- Mappings (Persian row names used in your file) ----------
 REQ_ROWS = {
@@ -77,140 +37,197 @@ SUPP_ROWS = {
     "OperatingMargin": "حاشیه سود عملیاتی"
 }
 
+# cash-flow statement (گردش وجوه نقد)
+CF_ROWS = {
+    "OperatingCashFlow": "جریان خالص ورود (خروج) نقد حاصل از فعالیت های عملیاتی",
+    "InvestingCashFlow": "جریان خالص ورود (خروج) نقد حاصل از فعالیتهای سرمایه گذاری",
+    "FinancingCashFlow": "جریان خالص ورود (خروج) نقد حاصل از فعالیت های تامین مالی",
+    "EndingCash": "مانده موجودی نقد در پایان دوره"
+}
+ALL_ROWS = {**REQ_ROWS, **SUPP_ROWS, **CF_ROWS}
+
+# ---------- Per-company extraction ----------
+def extract_company(sheet, df_rows):
+    """Feature rows and missing-log rows for one company's 'row label × period' frame."""
+    rows_out = []
+    missing_log = []
+    # identify year columns: assume the columns except first_col are the date columns
+    year_cols = list(df_rows.columns)
+    # convert year labels to simple year (first part before '/'), map column -> year_str
+    year_map = {}
+    for col in year_cols:
+        s = str(col)
+        s = normalize_text(s)
+        # extract leading year digits
+        m = re.match(r'(\d{3,4})', s)
+        year = m.group(1) if m else s
+        year_map[col] = year
+
+    # resolve every metric to its row once per sheet; reused for all year columns
+    row_map = resolve_rows(df_rows.index, ALL_ROWS)
+    # parse every cell of the sheet to a number in one vectorized pass
+    num_rows = to_number_frame(df_rows)
+
+    # for each year column, extract required rows
+    for col in year_cols:
+        year = year_map[col]
+        missing = []
+        vals = {}
+        # required metrics, then supplemental and cash-flow ones
+        for key, persian_name in ALL_ROWS.items():
+            idx = row_map[key]
+            if idx is None:
+                vals[key] = float('nan')
+                missing.append((year, sheet, key, persian_name, "row_not_found"))
+            else:
+                num = num_rows.at[idx, col]
+                vals[key] = num
+                if pd.isna(num):
+                    missing.append((year, sheet, key, persian_name, "value_na_or_unparseable"))
+        out_row = {
+            "Company": sheet,
+            "Year": year,
+            # raw base numbers
+            "CurrentAssets": vals.get("CurrentAssets"),
+            "CurrentLiabilities": vals.get("CurrentLiabilities"),
+            "TotalAssets": vals.get("TotalAssets"),
+            "TotalLiabilities": vals.get("TotalLiabilities"),
+            "RetainedEarnings": vals.get("RetainedEarnings"),
+            "EBIT": vals.get("EBIT"),
+            "Sales": vals.get("Sales"),
+            "Equity": vals.get("Equity"),
+            # X components (computed over the whole table)
+            "X1": float('nan'), "X2": float('nan'), "X3": float('nan'), "X4": float('nan'), "X5": float('nan'),
+            # supplemental
+            "ROA": vals.get("ROA"),
+            "ROE": vals.get("ROE"),
+            "CurrentRatio": vals.get("CurrentRatio"),
+            "DebtRatio": vals.get("DebtRatio"),
+            "OperatingMargin": vals.get("OperatingMargin"),
+            # cash flow (ratios computed over the whole table)
+            "OperatingCashFlow": vals.get("OperatingCashFlow"),
+            "InvestingCashFlow": vals.get("InvestingCashFlow"),
+            "FinancingCashFlow": vals.get("FinancingCashFlow"),
+            "EndingCash": vals.get("EndingCash")
+        }
+        rows_out.append(out_row)
+        # append missing info
+        for m in missing:
+            missing_log.append({
+                "Year": m[0], "Company": m[1], "Key": m[2], "PersianName": m[3], "Reason": m[4]
+            })
+    return rows_out, missing_log
+
+
+def load_companies(file_path):
+    """(company names, function company -> 'row label × period' frame) for a workbook or tidy store."""
+    if file_path.endswith(".parquet"):
+        # tidy store from combine_all.py / edit_all.py: pivot each company directly
+        tidy = read_tidy(file_path)
+        return companies_in(tidy), lambda sheet: pivot_company(tidy, sheet)
+    # stream all sheets in one pass, keeping only rows that may hold a metric (cached when unchanged)
+    all_sheets = read_rows_cached(file_path, list(ALL_ROWS.values()), sheet_name=None)
+    # first column is row labels (e.g., "سال مالی" header then date columns)
+    return list(all_sheets), lambda sheet: all_sheets[sheet].set_index(all_sheets[sheet].columns[0])
+
+
 # ---------- Main ----------
-def main():
-    print("Place the combined Excel (each sheet = one company) in same folder as this script.")
-    file_path = input("Enter Excel filename (e.g., combined_all_companies.xlsx): ").strip()
-    if not os.path.exists(file_path):
-        print("File not found. Exiting.")
-        return
+@profiled("features")
+def build_features(file_path, out_dir="", incremental=False, memory=None):
+    """Extract features for every company; returns the path of the features workbook.
+
+    With incremental=True, companies whose sheet content hash matches the
+    manifest keep their rows from the existing features file and only the
+    changed ones are re-extracted and spliced in. If memory["merged"] holds
+    the cleaned sheets (pipeline runs), they are used instead of reading
+    file_path, and the saved features table is left in memory["features"].
+    """
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    out_file = os.path.join(out_dir, f"{base_name}_Cleaned_Features.xlsx")
+    log_file = os.path.join(out_dir, f"{base_name}_missing_log.csv")
 
     # Prepare output structures
     rows_out = []
     missing_log = []
 
-    # read all sheet names (company names)
-    xls = pd.ExcelFile(file_path)
-    sheets = xls.sheet_names
+    if memory and memory.get("merged") is not None:
+        frames = memory["merged"]
+        sheets, get_rows = list(frames), lambda sheet: frames[sheet].set_index(frames[sheet].columns[0])
+    else:
+        sheets, get_rows = load_companies(file_path)
     print(f"Found {len(sheets)} sheets (companies).")
 
+    manifest_dir = os.path.dirname(os.path.abspath(file_path))
+    manifest = load_manifest(manifest_dir)
+    splice = incremental and os.path.exists(out_file)
+    rebuilt = set()
+
     for sheet in sheets:
+        # rows as index, one column per period
+        df_rows = get_rows(sheet)
+        digest = frame_digest(df_rows)
+        if splice and stage_entry(manifest, "features", sheet).get("input") == digest:
+            continue
         print(f"Processing company: {sheet} ...")
-        df = pd.read_excel(xls, sheet_name=sheet, header=0)
-        # first column is row labels (e.g., "سال مالی" header then date columns)
-        first_col = df.columns[0]
-        # set rows as index
-        df_rows = df.set_index(first_col)
-        # identify year columns: assume the columns except first_col are the date columns
-        year_cols = list(df_rows.columns)
-        # convert year labels to simple year (first part before '/'), map column -> year_str
-        year_map = {}
-        for col in year_cols:
-            s = str(col)
-            s = normalize_text(s)
-            # extract leading year digits
-            m = re.match(r'(\d{3,4})', s)
-            year = m.group(1) if m else s
-            year_map[col] = year
-
-        # for each year column, extract required rows
-        for col in year_cols:
-            year = year_map[col]
-            missing = []
-            vals = {}
-            # required metrics
-            for key, persian_name in REQ_ROWS.items():
-                idx = find_row_index(df_rows.index, persian_name)
-                if idx is None:
-                    vals[key] = float('nan')
-                    missing.append((year, sheet, key, persian_name, "row_not_found"))
-                else:
-                    raw = df_rows.at[idx, col]
-                    num = to_number(raw)
-                    vals[key] = num
-                    if pd.isna(num):
-                        missing.append((year, sheet, key, persian_name, "value_na_or_unparseable"))
-            # supplemental
-            for key, persian_name in SUPP_ROWS.items():
-                idx = find_row_index(df_rows.index, persian_name)
-                if idx is None:
-                    vals[key] = float('nan')
-                    missing.append((year, sheet, key, persian_name, "row_not_found"))
-                else:
-                    raw = df_rows.at[idx, col]
-                    num = to_number(raw)
-                    vals[key] = num
-                    if pd.isna(num):
-                        missing.append((year, sheet, key, persian_name, "value_na_or_unparseable"))
-            # compute X1..X5 if possible (we will compute in features file too)
-            # X1 = (CurrentAssets - CurrentLiabilities) / TotalAssets
-            try:
-                X1 = (vals["CurrentAssets"] - vals["CurrentLiabilities"]) / vals["TotalAssets"] if not pd.isna(vals["TotalAssets"]) and vals["TotalAssets"] != 0 else float('nan')
-            except:
-                X1 = float('nan')
-            try:
-                X2 = vals["RetainedEarnings"] / vals["TotalAssets"] if not pd.isna(vals["TotalAssets"]) and vals["TotalAssets"] != 0 else float('nan')
-            except:
-                X2 = float('nan')
-            try:
-                X3 = vals["EBIT"] / vals["TotalAssets"] if not pd.isna(vals["TotalAssets"]) and vals["TotalAssets"] != 0 else float('nan')
-            except:
-                X3 = float('nan')
-            try:
-                X4 = vals["Equity"] / vals["TotalLiabilities"] if not pd.isna(vals["TotalLiabilities"]) and vals["TotalLiabilities"] != 0 else float('nan')
-            except:
-                X4 = float('nan')
-            try:
-                X5 = vals["Sales"] / vals["TotalAssets"] if not pd.isna(vals["TotalAssets"]) and vals["TotalAssets"] != 0 else float('nan')
-            except:
-                X5 = float('nan')
-
-            out_row = {
-                "Company": sheet,
-                "Year": year,
-                # raw base numbers
-                "CurrentAssets": vals.get("CurrentAssets"),
-                "CurrentLiabilities": vals.get("CurrentLiabilities"),
-                "TotalAssets": vals.get("TotalAssets"),
-                "TotalLiabilities": vals.get("TotalLiabilities"),
-                "RetainedEarnings": vals.get("RetainedEarnings"),
-                "EBIT": vals.get("EBIT"),
-                "Sales": vals.get("Sales"),
-                "Equity": vals.get("Equity"),
-                # X components
-                "X1": X1, "X2": X2, "X3": X3, "X4": X4, "X5": X5,
-                # supplemental
-                "ROA": vals.get("ROA"),
-                "ROE": vals.get("ROE"),
-                "CurrentRatio": vals.get("CurrentRatio"),
-                "DebtRatio": vals.get("DebtRatio"),
-                "OperatingMargin": vals.get("OperatingMargin")
-            }
-            rows_out.append(out_row)
-            # append missing info
-            for m in missing:
-                missing_log.append({
-                    "Year": m[0], "Company": m[1], "Key": m[2], "PersianName": m[3], "Reason": m[4]
-                })
+        with profile("features", sheet) as rec:
+            company_rows, company_missing = extract_company(sheet, df_rows)
+            rec["rows"] = len(company_rows)
+            rec["missing"] = len(company_missing)
+        rows_out.extend(company_rows)
+        missing_log.extend(company_missing)
+        record_stage(manifest, "features", sheet, digest)
+        rebuilt.add(sheet)
 
     # build DataFrame and save
     df_out = pd.DataFrame(rows_out)
+    if not df_out.empty:
+        # X1..X5 for all company-years at once (NaN where a denominator is missing or zero)
+        df_out[X_COLS] = compute_ratios(df_out)
+        df_out[CASH_FLOW_COLS] = compute_cash_flow_ratios(df_out)
+
+    current()["companies"] = len(rebuilt)
+
+    if splice:
+        # keep the unchanged companies' rows from the previous run
+        print(f"♻️ Incremental run: re-extracted {len(rebuilt)} of {len(sheets)} companies")
+        keep = lambda df: df[df["Company"].isin(sheets) & ~df["Company"].isin(rebuilt)]
+        old_out = keep(read_excel_cached(out_file))
+        df_out = pd.concat([old_out.assign(Year=old_out["Year"].astype(str)), df_out], ignore_index=True)
+        if os.path.exists(log_file):
+            old_log = keep(pd.read_csv(log_file, encoding='utf-8-sig', dtype={"Year": str}))
+            missing_log = old_log.to_dict("records") + missing_log
+
     # sort for readability
     df_out = df_out.sort_values(["Company", "Year"]).reset_index(drop=True)
 
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    out_file = f"{base_name}_Cleaned_Features.xlsx"
     df_out.to_excel(out_file, index=False)
     print(f"Saved features to: {out_file}")
+    current()["rows"] = len(df_out)
+    forget_missing(manifest, "features", sheets)
+    save_manifest(manifest_dir, manifest)
 
     # save missing log
     if missing_log:
         log_df = pd.DataFrame(missing_log)
-        log_file = f"{base_name}_missing_log.csv"
         log_df.to_csv(log_file, index=False, encoding='utf-8-sig')
         print(f"Saved missing-log to: {log_file} (rows: {len(log_df)})")
     else:
         print("No missing entries logged.")
+    if memory is not None:
+        # as saved: the .xlsx keeps fewer float digits, and zscore digests must match a standalone run
+        memory["features"] = read_excel_cached(out_file)
+    return out_file
+
+
+def main():
+    print("Place the combined Excel (each sheet = one company) or Merged_All_tidy.parquet in same folder as this script.")
+    file_path = input("Enter Excel filename (e.g., combined_all_companies.xlsx): ").strip()
+    if not os.path.exists(file_path):
+        print("File not found. Exiting.")
+        return
+    incremental = input("Only re-extract changed companies? (y/N): ").strip().lower() == "y"
+    build_features(file_path, incremental=incremental)
+    write_report(os.path.dirname(os.path.abspath(file_path)))
 
 if __name__ == "__main__":
     main()
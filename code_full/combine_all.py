@@ -1,92 +1,327 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 import pandas as pd
 
-# === USER INPUT ===
-main_path = input("Please enter the main directory path: ").strip()
+from excel_cache import load_frame, read_excel_cached, save_frame
+from manifest import (combine_digests, file_digest, forget_missing, load_manifest, record_stage,
+                      save_manifest, stage_entry)
+from profiling import current, peak_rss_mb, profiled, record, write_report
+from tidy_store import TIDY_FILE, TidyWriter, tidy_company
+from xlsx_writer import StreamingWorkbook
 
 # === SUBFOLDERS ===
-folders = ["ترازنامه", "سود و زیان", "نسبت های مالی"]
-
-# === DETECT ALL COMPANIES ===
-companies = set()
-
-for folder in folders:
-    folder_path = os.path.join(main_path, folder)
-    if not os.path.exists(folder_path):
-        print(f"⚠️ Folder not found: {folder_path}")
-        continue
-    
-    for file in os.listdir(folder_path):
-        if file.endswith(".xlsx"):
-            # Extract company name (everything before the first space)
-            company_name = file.split(" ")[0]
-            companies.add(company_name)
-
-companies = sorted(list(companies))
-print(f"✅ Found {len(companies)} companies: {companies}")
-
-# === PREPARE OUTPUT FILES ===
-output_all = os.path.join(main_path, "Merged_All.xlsx")
-missing_log = []
-
-# Create the all-in-one Excel writer
-writer_all = pd.ExcelWriter(output_all, engine='openpyxl')
-
-# === MAIN LOOP ===
-for company_name in companies:
-    print(f"\n🔹 Processing company: {company_name}")
-    data_parts = {}
-    missing_parts = []
+folders = ["ترازنامه", "سود و زیان", "نسبت های مالی", "گردش وجوه نقد"]
+# raw (uncleaned) merge of every company, kept for incremental runs:
+# edit_all.py cleans <company>_Merged.xlsx in place, so that file cannot be reused
+RAW_DIR = "merge_raw"
+
+
+def raw_merge_path(main_path, company_name):
+    return os.path.join(main_path, RAW_DIR, f"{company_name}.parquet")
 
-    for folder in folders:
-        file_path = os.path.join(main_path, folder, f"{company_name} {folder}.xlsx")
 
-        if not os.path.exists(file_path):
-            print(f"  ❌ Missing file in {folder}")
-            missing_parts.append(folder)
+# === FUNCTION: DETECT ALL COMPANIES ===
+def detect_companies(main_path):
+    companies = set()
+
+    for folder in folders:
+        folder_path = os.path.join(main_path, folder)
+        if not os.path.exists(folder_path):
+            print(f"⚠️ Folder not found: {folder_path}")
             continue
 
+        for file in os.listdir(folder_path):
+            if file.endswith(".xlsx"):
+                # Extract company name (everything before the first space)
+                company_name = file.split(" ")[0]
+                companies.add(company_name)
+
+    return sorted(companies)
+
+
+# === FUNCTION: LOAD ONE STATEMENT WORKBOOK ===
+def read_statement(main_path, company_name, folder):
+    """Load one of a company's statement files.
+
+    This is the unit of work of the process pool, so a company's four
+    statements are parsed side by side; it only returns the frame (None if
+    the file is missing or unreadable), a log line and timings.
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    file_path = os.path.join(main_path, folder, f"{company_name} {folder}.xlsx")
+    df = None
+    if not os.path.exists(file_path):
+        message = f"  ❌ Missing file in {folder}"
+    else:
         try:
-            df = pd.read_excel(file_path)
-            data_parts[folder] = df
-            print(f"  ✅ Loaded: {folder}")
+            df = read_excel_cached(file_path)
+            message = f"  ✅ Loaded: {folder} ({time.perf_counter() - start:.2f}s)"
         except Exception as e:
-            print(f"  ⚠️ Error reading {folder}: {e}")
-            missing_parts.append(folder)
+            message = f"  ⚠️ Error reading {folder}: {e}"
+    return {
+        "folder": folder,
+        "data": df,
+        "message": message,
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# === FUNCTION: BUILD ONE COMPANY'S MERGED FRAME ===
+def assemble_company(company_name, statements):
+    """Stack read_statement() results (in `folders` order) with separator rows.
+
+    Returns the merged frame, its log lines and timings; all writing happens
+    in the parent process.
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    pieces = []
+    for st in statements:
+        if st["data"] is not None:
+            df = st["data"]
+            separator = pd.DataFrame([[f"--- {st['folder']} ---"]], columns=[df.columns[0]])
+            pieces.extend([separator, df])
+    combined_data = pd.concat(pieces, ignore_index=True) if pieces else None
+
+    rss = [r for r in [peak_rss_mb()] + [st["peak_rss_mb"] for st in statements] if r is not None]
+    return {
+        "company": company_name,
+        "data": combined_data,
+        "missing": [st["folder"] for st in statements if st["data"] is None],
+        "messages": [st["message"] for st in statements],
+        "timings": {st["folder"]: st["seconds"] for st in statements if st["data"] is not None},
+        "seconds": sum(st["seconds"] for st in statements) + time.perf_counter() - start,
+        "cpu_seconds": sum(st["cpu_seconds"] for st in statements) + time.process_time() - cpu_start,
+        "peak_rss_mb": max(rss) if rss else None,
+    }
+
+
+def merge_company(main_path, company_name):
+    """Load and stack one company's statements in this process."""
+    return assemble_company(company_name, [read_statement(main_path, company_name, folder) for folder in folders])
+
+
+# === FUNCTION: REUSE AN UNCHANGED COMPANY'S RAW MERGE ===
+def reuse_company(main_path, company_name, manifest):
+    """Same result shape as merge_company(), read back from the stored raw merge."""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    has_data = stage_entry(manifest, "merge", company_name).get("output") is not None
+    missing_parts = [folder for folder in folders
+                     if not os.path.exists(os.path.join(main_path, folder, f"{company_name} {folder}.xlsx"))]
+    return {
+        "company": company_name,
+        "data": load_frame(raw_merge_path(main_path, company_name)) if has_data else None,
+        "missing": missing_parts,
+        "messages": ["  ♻️ Sources unchanged — reused the previous merge"],
+        "timings": {},
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "peak_rss_mb": peak_rss_mb(),
+        "reused": True,
+    }
+
+
+def reusable(main_path, company_name, manifest, digest):
+    """True if the sources are unchanged and the stored raw merge is still this stage's output.
+
+    A company whose sources gave no data is recorded with output None and
+    stays reusable as long as its sources do not change.
+    """
+    entry = stage_entry(manifest, "merge", company_name)
+    if entry.get("input") != digest:
+        return False
+    if entry.get("output") is None:
+        return "output" in entry
+    raw_path = raw_merge_path(main_path, company_name)
+    return os.path.exists(raw_path) and entry["output"] == file_digest(raw_path)
+
+
+# === FUNCTION: CONTENT HASH OF ONE COMPANY'S SOURCE FILES ===
+def source_digest(main_path, company_name, manifest):
+    parts = []
+    for folder in folders:
+        rel_path = os.path.join(folder, f"{company_name} {folder}.xlsx")
+        file_path = os.path.join(main_path, rel_path)
+        digest = file_digest(file_path) if os.path.exists(file_path) else "missing"
+        manifest["sources"][rel_path] = digest
+        parts.append((folder, digest))
+    return combine_digests(parts)
+
 
-    # === COMBINE IF ANY DATA EXISTS ===
-    if data_parts:
-        combined_data = pd.DataFrame()
-        for section_name, df in data_parts.items():
-            separator = pd.DataFrame([[f"--- {section_name} ---"]], columns=[df.columns[0]])
-            combined_data = pd.concat([combined_data, separator, df], ignore_index=True)
+# === FUNCTION: MERGE ALL COMPANIES (SERIAL OR PROCESS POOL) ===
+def iter_merged(main_path, companies, workers=1):
+    """Yield merge_company() results in the same order as `companies`.
 
-        # (1) Save individual merged file
-        output_single = os.path.join(main_path, f"{company_name}_Merged.xlsx")
-        combined_data.to_excel(output_single, index=False)
-        print(f"  💾 Created individual merged file: {output_single}")
+    With workers > 1 the companies are parsed in a process pool and yielded in
+    input order, so the output files are identical to a serial run. At most
+    2 × workers results are in flight, which keeps memory bounded when the
+    parent writes slower than the workers parse.
+    """
+    if workers <= 1 or len(companies) <= 1:
+        for company_name in companies:
+            yield merge_company(main_path, company_name)
+        return
 
-        # (2) Add to combined file (all companies)
-        combined_data.to_excel(writer_all, sheet_name=company_name[:31], index=False)
+    # one task per statement file, so the pool stays busy within a company too
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        submit = lambda c: (c, [executor.submit(read_statement, main_path, c, folder) for folder in folders])
+        todo = iter(companies)
+        pending = deque(submit(c) for c in islice(todo, 2 * workers))
+        while pending:
+            company_name, futures = pending.popleft()
+            result = assemble_company(company_name, [f.result() for f in futures])
+            for c in islice(todo, 1):
+                pending.append(submit(c))
+            yield result
 
+
+@profiled("merge")
+def run_merge(main_path, workers=1, incremental=False, memory=None):
+    """Merge every company's statements into <company>_Merged.xlsx and Merged_All.xlsx.
+
+    The raw merge of each company is also stored in <main_path>/merge_raw;
+    with incremental=True, companies whose sources are unchanged are read
+    back from there and their _Merged.xlsx (possibly cleaned since) is left
+    as it is.
+
+    If a `memory` dict is given (single-process pipeline runs), the merged
+    frames are also kept in memory["merged"] so the next stage can skip
+    re-reading the workbooks.
+    """
+    companies = detect_companies(main_path)
+    print(f"✅ Found {len(companies)} companies: {companies}")
+    if workers > 1:
+        print(f"⚙️ Using {workers} worker processes")
+
+    # === CONTENT HASHES (INCREMENTAL RUNS) ===
+    manifest = load_manifest(main_path)
+    digests = {c: source_digest(main_path, c, manifest) for c in companies}
+    to_build = companies
+    if incremental:
+        changed = [c for c in companies if stage_entry(manifest, "merge", c).get("input") != digests[c]]
+        to_build = [c for c in companies if not reusable(main_path, c, manifest, digests[c])]
+        print(f"♻️ Incremental run: sources of {len(changed)} of {len(companies)} companies changed, "
+              f"{len(to_build)} to merge again")
+    rebuild = set(to_build)
+
+    # === PREPARE OUTPUT FILES ===
+    output_all = os.path.join(main_path, "Merged_All.xlsx")
+    missing_log = []
+    timing_log = []
+    start = time.perf_counter()
+
+    if memory is not None:
+        memory["merged"] = {}
+
+    # Create the all-in-one Excel writer (write-only: each sheet is flushed as it is added);
+    # both outputs are discarded, temp files included, if the loop fails
+    with StreamingWorkbook(output_all) as writer_all, \
+            TidyWriter(os.path.join(main_path, TIDY_FILE)) as tidy_writer:
+        # === MAIN LOOP ===
+        built = iter_merged(main_path, to_build, workers)
+        for company_name in companies:
+            result = next(built) if company_name in rebuild else reuse_company(main_path, company_name, manifest)
+            combined_data = result["data"]
+            print(f"\n🔹 Processing company: {company_name}")
+            for message in result["messages"]:
+                print(message)
+
+            # === COMBINE IF ANY DATA EXISTS ===
+            if combined_data is not None:
+                # (1) Keep the raw merge for later incremental runs
+                if not result.get("reused"):
+                    raw_path = raw_merge_path(main_path, company_name)
+                    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+                    # an unsaved raw merge records no digest, so the company is merged again next time
+                    raw_digest = file_digest(raw_path) if save_frame(combined_data, raw_path) else ""
+                    record_stage(manifest, "merge", company_name, digests[company_name], raw_digest)
+
+                # (2) Save individual merged file (a reused company keeps its file, cleaned or not)
+                output_single = os.path.join(main_path, f"{company_name}_Merged.xlsx")
+                if not result.get("reused") or not os.path.exists(output_single):
+                    combined_data.to_excel(output_single, index=False)
+                    print(f"  💾 Created individual merged file: {output_single}")
+
+                # (3) Add to combined file (all companies)
+                writer_all.add_sheet(company_name[:31], combined_data)
+
+                # (4) Long-format rows for the tidy store
+                tidy_writer.add(tidy_company(company_name, combined_data))
+
+                if memory is not None:
+                    memory["merged"][company_name] = combined_data
+
+            else:
+                print(f"  ⚠️ No data found for {company_name} — skipped")
+                if not result.get("reused"):
+                    record_stage(manifest, "merge", company_name, digests[company_name])
+
+            # Record missing info
+            if result["missing"]:
+                missing_log.append({"Company": company_name, "Missing Sections": ", ".join(result["missing"])})
+
+            timing_row = {"Company": company_name}
+            timing_row.update({folder: result["timings"].get(folder) for folder in folders})
+            timing_row["Total (s)"] = result["seconds"]
+            timing_log.append(timing_row)
+            record("merge", company_name, wall_s=round(result["seconds"], 4),
+                   cpu_s=round(result["cpu_seconds"], 4), peak_rss_mb=result["peak_rss_mb"],
+                   sheets=len(result["timings"]), rows=0 if combined_data is None else len(combined_data),
+                   reused=bool(result.get("reused")))
+
+        output_tidy = tidy_writer.close()
+
+    current().update(companies=len(companies), rebuilt=len(to_build))
+    forget_missing(manifest, "merge", companies)
+    save_manifest(main_path, manifest)
+    print(f"\n✅ All-in-one file created: {output_all}")
+
+    # The tidy (company, statement, label, year, value) table
+    if output_tidy:
+        print(f"✅ Tidy store created: {output_tidy}")
+
+    # === CREATE MISSING REPORT ===
+    if missing_log:
+        missing_df = pd.DataFrame(missing_log)
+        output_missing = os.path.join(main_path, "Missing_Report.xlsx")
+        missing_df.to_excel(output_missing, index=False)
+        print(f"⚠️ Missing data report saved: {output_missing}")
     else:
-        print(f"  ⚠️ No data found for {company_name} — skipped")
-
-    # Record missing info
-    if missing_parts:
-        missing_log.append({"Company": company_name, "Missing Sections": ", ".join(missing_parts)})
-
-# Save the all-in-one Excel
-writer_all.close()
-print(f"\n✅ All-in-one file created: {output_all}")
-
-# === CREATE MISSING REPORT ===
-if missing_log:
-    missing_df = pd.DataFrame(missing_log)
-    output_missing = os.path.join(main_path, "Missing_Report.xlsx")
-    missing_df.to_excel(output_missing, index=False)
-    print(f"⚠️ Missing data report saved: {output_missing}")
-else:
-    print("✅ No missing files detected.")
-
-print("\n🎯 Merging process completed successfully.")
+        print("✅ No missing files detected.")
+
+    # === PER-COMPANY TIMING REPORT ===
+    if timing_log:
+        timing_df = pd.DataFrame(timing_log).sort_values("Total (s)", ascending=False)
+        output_timing = os.path.join(main_path, "Merge_Timings.csv")
+        timing_df.to_csv(output_timing, index=False, encoding='utf-8-sig')
+        print(f"⏱️ Per-company timings saved: {output_timing}")
+        print("   Slowest companies:")
+        for _, row in timing_df.head(5).iterrows():
+            print(f"   {row['Company']}: {row['Total (s)']:.2f}s")
+
+    print(f"\n🎯 Merging process completed successfully in {time.perf_counter() - start:.1f}s.")
+    return output_all
+
+
+def main():
+    # === USER INPUT ===
+    main_path = input("Please enter the main directory path: ").strip()
+    workers = input("Number of worker processes (Enter = 1, 0 = all cores): ").strip()
+    workers = int(workers) if workers else 1
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    incremental = input("Only re-merge companies whose source files changed? (y/N): ").strip().lower() == "y"
+    run_merge(main_path, workers, incremental)
+    write_report(main_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import os
-import pandas as pd
 import glob
 
-# === USER INPUT ===
-main_path = input("Please enter the main directory path: ").strip()
+from excel_cache import read_excel_cached
+from labels import RowFilter
+from manifest import file_digest, forget_missing, load_manifest, record_stage, save_manifest, stage_entry
+from profiling import current, profile, profiled, write_report
+from tidy_store import TIDY_FILE, TidyWriter, tidy_company
+from xlsx_writer import StreamingWorkbook
 
 # === ROWS TO REMOVE (exact or partial match) ===
 rows_to_remove = [
@@ -14,21 +17,16 @@ rows_to_remove = [
     "اقلام غیر مترقبه",
     "اثرات انباشته تغییر در اصول و روشهای"
 ]
-
-# === OUTPUT FILE PATHS ===
-output_all = os.path.join(main_path, "Merged_All.xlsx")
+row_filter = RowFilter(rows_to_remove)  # compiled once, one scan per sheet
 
 # === FUNCTION: CLEAN DATAFRAME ===
 def clean_dataframe(df):
-    if df.empty:
-        return df
-    # Find which column contains row labels (usually the first one)
-    first_col = df.columns[0]
-    # Drop rows where the first column contains any of the unwanted phrases
-    for phrase in rows_to_remove:
-        df = df[~df[first_col].astype(str).str.contains(phrase, na=False)]
-    df.reset_index(drop=True, inplace=True)
-    return df
+    """Drop rows whose label (first column) contains an unwanted phrase.
+
+    Returns (cleaned df, {phrase: rows removed}); the phrases are matched
+    literally in a single pass over the label column.
+    """
+    return row_filter.apply(df)
 
 # === FUNCTION: EXTRACT COMPANY NAME FROM FILENAME ===
 def extract_company_name(filename):
@@ -41,59 +39,126 @@ def extract_company_name(filename):
     else:
         return base_name.split('.')[0]  # Fallback: remove extension only
 
-# === FIND ALL MERGED FILES ===
-pattern = os.path.join(main_path, "*_Merged.xlsx")
-company_files = glob.glob(pattern)
-
-print(f"📁 Found {len(company_files)} company files in directory")
-
-if not company_files:
-    print("❌ No company files found with pattern '*_Merged.xlsx'")
-    exit()
-
-# === PROCESS EACH COMPANY FILE ===
-all_company_data = {}
-
-for file_path in company_files:
-    company_name = extract_company_name(file_path)
-    print(f"⚙️ Processing: {company_name}")
-    
-    try:
-        # Read the company file
-        df = pd.read_excel(file_path)
-        
-        # Clean the dataframe
-        cleaned_df = clean_dataframe(df)
-        
-        # Save cleaned version (overwrite original)
-        cleaned_df.to_excel(file_path, index=False)
-        print(f"  ✅ Cleaned and saved: {os.path.basename(file_path)}")
-        
-        # Store for combined all file
-        all_company_data[company_name] = cleaned_df
-        
-    except Exception as e:
-        print(f"  ❌ Error processing {company_name}: {str(e)}")
-
-# === CREATE MERGED ALL FILE ===
-if all_company_data:
-    print(f"\n📊 Creating combined file with {len(all_company_data)} companies...")
-    
-    with pd.ExcelWriter(output_all, engine='openpyxl') as writer:
-        for company_name, df in all_company_data.items():
-            # Truncate sheet name if too long (Excel limit: 31 characters)
-            sheet_name = company_name[:31]
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-            print(f"  ✅ Added sheet: {sheet_name}")
-    
-    print(f"🎉 Successfully created: {output_all}")
-    
-    # Summary
-    print(f"\n📈 PROCESSING SUMMARY:")
-    print(f"   Total companies processed: {len(all_company_data)}")
-    print(f"   Combined file: {output_all}")
-    
-else:
-    print("❌ No data available to create combined file")
-
-print("\n✅ All operations completed!")
\ No newline at end of file
+# === FUNCTION: CLEAN ALL MERGED FILES ===
+@profiled("clean")
+def run_clean(main_path, incremental=False, memory=None):
+    """Clean every *_Merged.xlsx in main_path and rebuild Merged_All.xlsx.
+
+    With incremental=True, a file is reused as it is when the merge stage
+    recorded the same source hash as at its last clean and the file still
+    hashes to that clean's output (the merge leaves cleaned files of
+    unchanged companies alone).
+    If `memory` holds the frames of run_merge(), they are used instead of
+    reading the files back, and memory["merged"] is replaced by the cleaned
+    sheets (keyed by sheet name).
+    """
+    merged = (memory or {}).get("merged", {})
+    output_all = os.path.join(main_path, "Merged_All.xlsx")
+
+    # === FIND ALL MERGED FILES ===
+    pattern = os.path.join(main_path, "*_Merged.xlsx")
+    company_files = sorted(glob.glob(pattern))
+
+    print(f"📁 Found {len(company_files)} company files in directory")
+
+    if not company_files:
+        print("❌ No company files found with pattern '*_Merged.xlsx'")
+        return None
+
+    manifest = load_manifest(main_path)
+
+    # === STREAMING OUTPUTS: each cleaned sheet is written as soon as it is ready ===
+    # (closed on success; the temp files are dropped on an error or when nothing was cleaned)
+    processed = []
+    cleaned = {}
+    removed_total = dict.fromkeys(rows_to_remove, 0)
+    with StreamingWorkbook(output_all) as writer_all, \
+            TidyWriter(os.path.join(main_path, TIDY_FILE)) as tidy_writer:
+        # === PROCESS EACH COMPANY FILE ===
+        for file_path in company_files:
+            company_name = extract_company_name(file_path)
+
+            try:
+                with profile("clean", company_name) as rec:
+                    # keyed on the sources behind the file (None without a merge manifest) and on its bytes
+                    source = stage_entry(manifest, "merge", company_name).get("input")
+                    entry = stage_entry(manifest, "clean", company_name)
+                    if incremental and entry.get("input") == source and entry.get("output") == file_digest(file_path):
+                        # the frame from the merge stage is the raw one; the file holds the cleaned rows
+                        cleaned_df = read_excel_cached(file_path)
+                        print(f"♻️ Unchanged since last clean: {company_name}")
+                    else:
+                        print(f"⚙️ Processing: {company_name}")
+                        # Read the company file
+                        df = merged[company_name] if company_name in merged else read_excel_cached(file_path)
+
+                        # Clean the dataframe
+                        cleaned_df, removed = clean_dataframe(df)
+                        for phrase, n in removed.items():
+                            if n:
+                                removed_total[phrase] += n
+                                print(f"  🧹 Removed {n} row(s) containing: {phrase}")
+
+                        # Save cleaned version (overwrite original)
+                        cleaned_df.to_excel(file_path, index=False)
+                        print(f"  ✅ Cleaned and saved: {os.path.basename(file_path)}")
+                        record_stage(manifest, "clean", company_name, source, file_digest(file_path))
+                        rec["rows_removed"] = sum(removed.values())
+
+                    # Add to the combined all file (truncate sheet name: Excel limit is 31 characters)
+                    sheet_name = company_name[:31]
+                    writer_all.add_sheet(sheet_name, cleaned_df)
+                    tidy_writer.add(tidy_company(company_name, cleaned_df))
+                    processed.append(company_name)
+                    if memory is not None:
+                        cleaned[sheet_name] = cleaned_df
+                    print(f"  ✅ Added sheet: {sheet_name}")
+                    rec["rows"] = len(cleaned_df)
+
+            except Exception as e:
+                print(f"  ❌ Error processing {company_name}: {str(e)}")
+
+        if not processed:
+            writer_all.discard()
+            tidy_writer.discard()
+        output_tidy = tidy_writer.close()
+
+    if memory is not None:
+        memory["merged"] = cleaned
+    current().update(companies=len(processed), rows_removed=sum(removed_total.values()))
+    forget_missing(manifest, "clean", processed)
+    save_manifest(main_path, manifest)
+
+    # === FINISH MERGED ALL FILE ===
+    if processed:
+        print(f"\n🎉 Successfully created: {output_all}")
+
+        # The tidy store was rebuilt from the cleaned frames
+        if output_tidy:
+            print(f"🎉 Tidy store updated: {output_tidy}")
+
+        # Summary
+        print(f"\n📈 PROCESSING SUMMARY:")
+        print(f"   Total companies processed: {len(processed)}")
+        print(f"   Combined file: {output_all}")
+        print(f"   Rows removed: {sum(removed_total.values())}")
+        for phrase, n in removed_total.items():
+            print(f"     {n:>5}  {phrase}")
+
+    else:
+        print("❌ No data available to create combined file")
+
+    print("\n✅ All operations completed!")
+    return output_all if processed else None
+
+
+def main():
+    # === USER INPUT ===
+    main_path = input("Please enter the main directory path: ").strip()
+    incremental = input("Only re-clean changed companies? (y/N): ").strip().lower() == "y"
+    run_clean(main_path, incremental)
+    write_report(main_path)
+
+
+if __name__ == "__main__":
+    main()
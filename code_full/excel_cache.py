@@ -0,0 +1,367 @@
+# excel_cache.py
+"""Columnar cache in front of pd.read_excel.
+
+Every sheet read through read_excel_cached() (or read_rows_cached(), which
+keeps only the labeled rows a stage needs) is also stored as a Parquet file in
+CACHE_DIR, keyed by the source path, its mtime and its size. A second run on
+unchanged inputs loads the Parquet copy and never touches openpyxl; editing or
+replacing the workbook changes the key, and the stale copy is dropped on the
+next write. The directory is capped at CACHE_MAX_MB, evicting the least
+recently used entries first.
+
+Several processes may share the cache (the merge pool does): every writer
+goes through its own temporary file, cleanup never touches another writer's
+*.tmp, and an entry that vanishes under a reader is simply parsed again. A
+cache failure never fails the read.
+
+Settings (environment variables):
+    RAHAVARD_CACHE_DIR     cache directory (default: ~/.cache/uni_rahavard)
+    RAHAVARD_CACHE_MAX_MB  size cap in MB (default: 512)
+    RAHAVARD_CACHE=0       disable the cache and always parse the .xlsx
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # cache is optional: without pyarrow we just parse the .xlsx
+    pa = None
+    pq = None
+
+CACHE_DIR = os.environ.get(
+    "RAHAVARD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "uni_rahavard"))
+CACHE_MAX_MB = float(os.environ.get("RAHAVARD_CACHE_MAX_MB", "512"))
+CACHE_ENABLED = os.environ.get("RAHAVARD_CACHE", "1") != "0" and pa is not None
+
+_META_KEY = b"rahavard_cache"
+
+
+# ---------- Keys ----------
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _entry_paths(path, what, kwargs, ext):
+    """Return (prefix, entry_path) for one cached object of one source file.
+
+    The prefix identifies the source and the requested sheet; the suffix
+    identifies the file state (mtime + size), so any change gives a new entry.
+    """
+    src = os.path.abspath(path)
+    st = os.stat(src)
+    prefix = _hash(f"{src}|{what}|{sorted(kwargs.items())!r}")[:20]
+    state = _hash(f"{st.st_mtime_ns}|{st.st_size}")[:12]
+    return prefix, os.path.join(CACHE_DIR, f"{prefix}-{state}{ext}")
+
+
+# ---------- Mixed-type object columns ----------
+# Sheets from Rahavard mix text and numbers in the same column ("نوع گزارش"
+# rows above the figures), which Parquet cannot store as one column. Such
+# columns are written as (kind, text) pairs and rebuilt exactly on load.
+_KINDS = {int: "i", float: "f", str: "s", bool: "b", datetime.datetime: "d"}
+
+
+def _encode_values(values):
+    kinds, texts = [], []
+    for v in values:
+        if v is None or (isinstance(v, float) and v != v) or v is pd.NaT:
+            kinds.append("n")
+            texts.append(None)
+            continue
+        if isinstance(v, pd.Timestamp):
+            v = v.to_pydatetime()
+        elif isinstance(v, np.generic):
+            v = v.item()
+        kind = _KINDS.get(type(v))
+        if kind is None:
+            raise TypeError(f"unsupported cell type {type(v).__name__}")
+        texts.append(v.isoformat() if kind == "d" else repr(v) if kind == "f" else str(v))
+        kinds.append(kind)
+    return kinds, texts
+
+
+def _decode_values(kinds, texts):
+    out = []
+    for kind, text in zip(kinds, texts):
+        if kind == "n":
+            out.append(float("nan"))
+        elif kind == "i":
+            out.append(int(text))
+        elif kind == "f":
+            out.append(float(text))
+        elif kind == "b":
+            out.append(text == "True")
+        elif kind == "d":
+            out.append(datetime.datetime.fromisoformat(text))
+        else:
+            out.append(text)
+    return out
+
+
+def _is_plain_column(series):
+    if series.dtype != object:
+        return True
+    types = {type(v) for v in series if not (v is None or (isinstance(v, float) and v != v))}
+    return types <= {str}
+
+
+# ---------- Parquet entries ----------
+def _write_frame(df, entry):
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise TypeError("only default RangeIndex frames are cached")
+    columns = {}
+    mixed = []
+    for pos in range(df.shape[1]):
+        series = df.iloc[:, pos]
+        if _is_plain_column(series):
+            columns[f"c{pos}"] = series.reset_index(drop=True)
+        else:
+            kinds, texts = _encode_values(series.tolist())
+            columns[f"k{pos}"] = pd.Series(kinds, dtype=object)
+            columns[f"t{pos}"] = pd.Series(texts, dtype=object)
+            mixed.append(pos)
+    name_kinds, name_texts = _encode_values(list(df.columns))
+    meta = {"names": [name_kinds, name_texts], "mixed": mixed, "rows": len(df)}
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: json.dumps(meta)})
+    pq.write_table(table, entry)
+
+
+def _read_frame(entry):
+    table = pq.read_table(entry)
+    meta = json.loads(table.schema.metadata[_META_KEY])
+    stored = table.to_pandas()
+    mixed = set(meta["mixed"])
+    names = _decode_values(*meta["names"])
+    data = {}
+    for pos in range(len(names)):
+        if pos in mixed:
+            data[pos] = pd.Series(_decode_values(stored[f"k{pos}"], stored[f"t{pos}"]), dtype=object)
+        else:
+            data[pos] = stored[f"c{pos}"]
+    df = pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]))
+    df.columns = names
+    return df
+
+
+TMP_SUFFIX = ".tmp"
+STALE_TMP_SECONDS = 3600  # a writer's temporary file older than this was left by a crash
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:  # another process got there first
+        pass
+
+
+def _store(prefix, entry, writer):
+    """writer(tmp) into a temporary file of this process, then rename it to entry."""
+    tmp = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(entry) + ".", suffix=TMP_SUFFIX, dir=CACHE_DIR)
+        os.close(fd)
+        writer(tmp)
+        os.replace(tmp, entry)
+        tmp = None
+        # invalidate older copies of the same source/sheet (other writers' *.tmp stay)
+        for name in os.listdir(CACHE_DIR):
+            full = os.path.join(CACHE_DIR, name)
+            if name.startswith(prefix + "-") and full != entry and not name.endswith(TMP_SUFFIX):
+                _remove(full)
+        enforce_cache_limit()
+    except (OSError, TypeError, ValueError, pa.ArrowException) as e:
+        print(f"  ⚠️ Cache skipped for {os.path.basename(entry)}: {e}")
+    finally:
+        if tmp is not None:
+            _remove(tmp)
+
+
+def _touch(entry):
+    # mtime doubles as the LRU clock (atime is often disabled)
+    try:
+        os.utime(entry, None)
+    except FileNotFoundError:
+        pass
+
+
+def _load(entry, reader):
+    """reader(entry) on a cache hit; None if the entry is missing, evicted meanwhile or unreadable."""
+    if not os.path.exists(entry):
+        return None
+    try:
+        result = reader(entry)
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        return None
+    _touch(entry)
+    return result
+
+
+def _load_all(entries):
+    """{name: frame} when every entry is a hit, else None."""
+    result = {}
+    for name, (_, entry) in entries.items():
+        result[name] = _load(entry, _read_frame)
+        if result[name] is None:
+            return None
+    return result
+
+
+# ---------- Public API ----------
+def enforce_cache_limit(max_mb=None):
+    """Evict least recently used entries until the cache fits in max_mb."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    limit = (CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        full = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:  # removed or renamed by another process
+            continue
+        if name.endswith(TMP_SUFFIX):
+            # another writer's file in flight; only leftovers of crashed runs go
+            if time.time() - st.st_mtime > STALE_TMP_SECONDS:
+                _remove(full)
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(size for _, size, _ in entries)
+    for _, size, full in sorted(entries):
+        if total <= limit:
+            break
+        _remove(full)
+        total -= size
+
+
+def clear_cache():
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            _remove(os.path.join(CACHE_DIR, name))
+
+
+def save_frame(df, path):
+    """Store a frame (default RangeIndex, mixed-type columns allowed) as one Parquet file.
+
+    The same format as the cache entries, written through a temporary file;
+    returns False (with a warning) if pyarrow is missing or the write failed.
+    """
+    if pa is None:
+        return False
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=TMP_SUFFIX,
+                                   dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+        _write_frame(df, tmp)
+        os.replace(tmp, path)
+        tmp = None
+        return True
+    except (OSError, TypeError, ValueError, pa.ArrowException) as e:
+        print(f"  ⚠️ Could not store {os.path.basename(path)}: {e}")
+        return False
+    finally:
+        if tmp is not None:
+            _remove(tmp)
+
+
+def load_frame(path):
+    """Frame written by save_frame(); None if the file is missing or unreadable."""
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        return _read_frame(path)
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        return None
+
+
+def _read_json(entry):
+    with open(entry, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def excel_sheet_names(path):
+    """Sheet names of a workbook, cached like the sheets themselves."""
+    if not CACHE_ENABLED:
+        return pd.ExcelFile(path).sheet_names
+    prefix, entry = _entry_paths(path, "__sheet_names__", {}, ".json")
+    cached = _load(entry, _read_json)
+    if cached is not None:
+        return cached
+    with pd.ExcelFile(path) as xls:
+        names = list(xls.sheet_names)
+
+    def write(target):
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(names, f, ensure_ascii=False)
+    _store(prefix, entry, write)
+    return names
+
+
+def read_excel_cached(path, sheet_name=0, **kwargs):
+    """Drop-in replacement for pd.read_excel(path, sheet_name=..., **kwargs).
+
+    sheet_name may be a sheet name, a position, or None for a dict of all
+    sheets (parsed in a single openpyxl pass on a cache miss).
+    """
+    if not CACHE_ENABLED:
+        return pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+
+    if sheet_name is None:
+        names = excel_sheet_names(path)
+        entries = {name: _entry_paths(path, f"sheet:{name}", kwargs, ".parquet") for name in names}
+        result = _load_all(entries)
+        if result is not None:
+            return result
+        result = pd.read_excel(path, sheet_name=None, **kwargs)
+        for name, df in result.items():
+            prefix, entry = entries[name]
+            _store(prefix, entry, lambda target, df=df: _write_frame(df, target))
+        return result
+
+    what = f"sheet:{sheet_name}" if isinstance(sheet_name, str) else f"pos:{sheet_name}"
+    prefix, entry = _entry_paths(path, what, kwargs, ".parquet")
+    df = _load(entry, _read_frame)
+    if df is not None:
+        return df
+    df = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+    _store(prefix, entry, lambda target: _write_frame(df, target))
+    return df
+
+
+def read_rows_cached(path, phrases, sheet_name=0):
+    """xlsx_reader.read_labeled_rows() with the same cache as read_excel_cached().
+
+    Entries are keyed by the requested phrases and the label matching rules
+    (labels.selection_key) too, so different row sets of the same workbook
+    are cached side by side and a grown synonym table is picked up.
+    """
+    from labels import selection_key
+    from xlsx_reader import read_labeled_rows
+    if not CACHE_ENABLED:
+        return read_labeled_rows(path, phrases, sheet_name)
+
+    key = {"phrases": tuple(sorted(phrases)), "labels": selection_key(phrases)}
+    names = excel_sheet_names(path) if sheet_name is None else [sheet_name]
+    entries = {}
+    for name in names:
+        what = f"rows:{name}" if isinstance(name, str) else f"rows-pos:{name}"
+        entries[name] = _entry_paths(path, what, key, ".parquet")
+    result = _load_all(entries)
+    if result is None:
+        result = read_labeled_rows(path, phrases, None) if sheet_name is None \
+            else {sheet_name: read_labeled_rows(path, phrases, sheet_name)}
+        for name, df in result.items():
+            prefix, entry = entries[name]
+            _store(prefix, entry, lambda target, df=df: _write_frame(df, target))
+    return result if sheet_name is None else result[sheet_name]
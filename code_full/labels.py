@@ -0,0 +1,434 @@
+# labels.py
+"""Row-label normalization and matching for the Rahavard statement sheets.
+
+Labels are matched in steps, each only for the phrases still unresolved:
+exact (normalize_text), canonical key or a known synonym, a fuzzy match,
+then substring and reverse substring. The canonical key (label_key) ignores
+spacing, zero-width joiners, punctuation and letter variants such as
+ي/ی, ئ/ی, ك/ک and آ/ا, so "دارائیها" and "دارایی‌ها" share one key. The
+fuzzy step accepts a label at most one or two edits away from the phrase
+(before the substring steps, which would rather pick a longer, different row).
+Candidates are blocked on shared character bigrams, so only a handful of
+labels are compared. Every fuzzy match is stored in the synonym table
+(label_synonyms.json), and later runs resolve it with one dict lookup.
+The table is plain JSON, {phrase: [accepted labels]}, and may be edited by
+hand to add or remove variants.
+
+Settings (environment variables):
+    RAHAVARD_LABEL_SYNONYMS   synonym table (default: ~/.cache/uni_rahavard_labels/label_synonyms.json)
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections import Counter, deque
+
+import pandas as pd
+
+from numeric import PERSIAN_DIGITS
+
+SYNONYMS_FILE = os.environ.get(
+    "RAHAVARD_LABEL_SYNONYMS",
+    os.path.join(os.path.expanduser("~"), ".cache", "uni_rahavard_labels", "label_synonyms.json"))
+MATCH_RULES = "exact|key|synonym|fuzzy-v1|substring|reverse"  # part of read_rows_cached's cache key
+# a fuzzy match must not add or drop one of these (جاری vs غیرجاری, خالص vs ناخالص)
+NEGATIONS = ("غیر", "نا", "بی", "عدم")
+
+
+# ---------- Normalization ----------
+def normalize_text(s):
+    if pd.isna(s):
+        return s
+    s = str(s)
+    # normalize arabic y/k to persian if present
+    s = s.replace('ي', 'ی').replace('ك', 'ک')
+    # remove zero-width and non-printable
+    s = re.sub(r'[\u200c\u200b\u200e\u200f]', '', s)
+    return s.strip()
+
+
+_CANONICAL = str.maketrans({**PERSIAN_DIGITS, **{ord(a): b for a, b in {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ؤ': 'و',
+}.items()}})
+# diacritics, tatweel, zero-width characters and direction marks
+_INVISIBLE = re.compile(r'[\u064b-\u065f\u0670\u0640\u200b-\u200f\u202a-\u202e\ufeff]')
+_TOKEN = re.compile(r'\w+')
+
+
+def label_tokens(s):
+    """Words of a label after folding letter/digit variants and dropping invisible characters."""
+    if pd.isna(s):
+        return []
+    return _TOKEN.findall(_INVISIBLE.sub('', str(s)).translate(_CANONICAL).lower())
+
+
+def label_key(s):
+    """Canonical key of a label: its tokens joined without spaces (spacing-insensitive)."""
+    return "".join(label_tokens(s))
+
+
+# ---------- Fuzzy matching with blocking ----------
+def max_edits(key):
+    """Edits a fuzzy match of `key` may differ by: none for short labels, 1, then 2."""
+    return 0 if len(key) < 6 else 1 if len(key) < 12 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or None if it is more than limit (banded)."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    too_far = limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [too_far] * (len(b) + 1)
+        cur[0] = i if i <= limit else too_far
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+        if min(cur[lo - 1:hi + 1]) > limit:
+            return None
+        prev = cur
+    return prev[len(b)] if prev[len(b)] <= limit else None
+
+
+def _bigrams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+def negation_differs(a, b):
+    """True if one label adds a negation the other lacks (a fuzzy match must not)."""
+    ta, tb = set(label_tokens(a)), set(label_tokens(b))
+    if set(NEGATIONS) & (ta ^ tb):
+        return True
+    return any(n + t in tb for t in ta for n in NEGATIONS) or any(n + t in ta for t in tb for n in NEGATIONS)
+
+
+class FuzzyIndex:
+    """Nearest key within max_edits() edits, compared only against keys sharing enough bigrams.
+
+    k edits destroy at most 2k of a key's distinct bigrams, so a key with fewer
+    shared bigrams (or a length k apart) cannot be a match and is never compared.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._index = {}
+        for kid, key in enumerate(self.keys):
+            for gram in _bigrams(key):
+                self._index.setdefault(gram, []).append(kid)
+
+    def best(self, key, accept=None):
+        """(id, distance) of the closest indexed key that accept(id) allows (lowest id on ties), or None."""
+        limit = max_edits(key)
+        if not limit:
+            return None
+        grams = _bigrams(key)
+        shared = Counter(kid for gram in grams for kid in self._index.get(gram, ()))
+        found = None
+        for kid, count in sorted(shared.items()):
+            if count < len(grams) - 2 * limit or abs(len(self.keys[kid]) - len(key)) > limit:
+                continue
+            dist = edit_distance(key, self.keys[kid], limit)
+            if dist is not None and (found is None or dist < found[1]) and (accept is None or accept(kid)):
+                found = (kid, dist)
+        return found
+
+
+# ---------- Synonym table ----------
+class SynonymTable:
+    """Accepted label variants per phrase, persisted as {phrase: [labels]} JSON.
+
+    Lookups go through label_key(), so a phrase's variants are one dict
+    access away. save() merges with the file on disk and writes through a
+    temporary file of its own, so parallel processes never trip over each
+    other's writes (two saves racing may still keep only one side's new
+    variants). A variant that was not saved only costs the fuzzy search
+    again on the next run.
+    """
+
+    def __init__(self, path=SYNONYMS_FILE):
+        self.path = path
+        self._entries = {}
+        self._keys = {}
+        self._dirty = False
+        self._merge(self._read())
+
+    def _read(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _merge(self, entries):
+        for phrase, variants in entries.items():
+            for label in variants:
+                self._add(phrase, label)
+
+    def _add(self, phrase, label):
+        phrase, label = normalize_text(phrase), normalize_text(label)
+        known = self._entries.setdefault(phrase, [])
+        if label in known:
+            return False
+        known.append(label)
+        self._keys.setdefault(label_key(phrase), []).append(label_key(label))
+        return True
+
+    def variants(self, phrase):
+        """label_key()s accepted for phrase."""
+        return self._keys.get(label_key(phrase), [])
+
+    def add(self, phrase, label):
+        self._dirty |= self._add(phrase, label)
+
+    def save(self):
+        if not self._dirty or not self.path:
+            return
+        tmp = None
+        try:
+            self._merge(self._read())
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=folder)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            tmp = None
+            self._dirty = False
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not save the label synonyms to {self.path}: {e}")
+        finally:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def signature(self, phrases):
+        """Hash of the variants known for phrases (changes when the table does)."""
+        known = {p: sorted(self.variants(p)) for p in sorted(phrases)}
+        return hashlib.sha1(json.dumps(known, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+
+_TABLE = None
+
+
+def synonym_table():
+    """The process-wide SynonymTable of SYNONYMS_FILE (loaded once)."""
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = SynonymTable(SYNONYMS_FILE)
+    return _TABLE
+
+
+def use_synonym_file(path):
+    """Point this process's synonym table at path (loaded on next use), e.g. a benchmark's own file."""
+    global SYNONYMS_FILE, _TABLE
+    os.environ["RAHAVARD_LABEL_SYNONYMS"] = SYNONYMS_FILE = path  # worker processes read the variable
+    _TABLE = None
+
+
+def selection_key(phrases):
+    """What decides which rows LabelSelector keeps for phrases (for cache keys)."""
+    return f"{MATCH_RULES}|{synonym_table().signature(phrases)}"
+
+
+# ---------- Multi-phrase substring matcher ----------
+class PhraseMatcher:
+    """Aho–Corasick automaton: find which of many phrases occur in a text in one scan."""
+
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        self._always = set()  # empty phrases are contained in every text
+        for pid, phrase in enumerate(self.phrases):
+            if phrase == "":
+                self._always.add(pid)
+                continue
+            state = 0
+            for ch in phrase:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                state = nxt
+            self._out[state].add(pid)
+
+        # breadth-first pass to build failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find_all(self, text):
+        """Return the ids (positions in `phrases`) of all phrases found in text."""
+        found = set(self._always)
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._out[state]:
+                found |= self._out[state]
+        return found
+
+
+# ---------- Row filter ----------
+class RowFilter:
+    """Drop every row whose label contains any of `phrases` (literal substrings).
+
+    The phrases are compiled once into a single escaped alternation, so a
+    sheet costs one scan of its label column however many phrases there are.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        self._pattern = re.compile("|".join(re.escape(p) for p in self.phrases)) if self.phrases else None
+        self._matcher = PhraseMatcher(self.phrases)
+
+    def apply(self, df, column=None):
+        """Return (kept rows with a fresh index, {phrase: number of rows it matched})."""
+        counts = dict.fromkeys(self.phrases, 0)
+        if df.empty or self._pattern is None:
+            return df.reset_index(drop=True), counts
+        labels = df[df.columns[0] if column is None else column].astype(str)
+        hit = labels.str.contains(self._pattern, na=False).to_numpy()
+        # attribute only the removed rows (usually a handful) to their phrases
+        for text in labels[hit]:
+            for pid in self._matcher.find_all(text):
+                counts[self.phrases[pid]] += 1
+        return df[~hit].reset_index(drop=True), counts
+
+
+# ---------- Row selection while streaming ----------
+class LabelSelector:
+    """Row-by-row test for the labels resolve_rows() could pick for `phrases`.
+
+    A row is wanted if its normalized label equals, contains or is contained
+    in a phrase, or shares a phrase's canonical key, synonym or fuzzy match.
+    Once every phrase has had an exact match (`complete`), no later row can
+    change resolve_rows()'s answer and a reader may stop.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = sorted({normalize_text(p) for p in phrases})
+        self._exact = set(self.phrases)
+        self._missing = set(self.phrases)
+        self._matcher = PhraseMatcher(self.phrases)
+        phrase_keys = sorted({label_key(p) for p in self.phrases})
+        self._keys = set(phrase_keys) | {k for p in self.phrases for k in synonym_table().variants(p)}
+        self._fuzzy = FuzzyIndex(phrase_keys)
+
+    @property
+    def complete(self):
+        return not self._missing
+
+    def wants(self, label):
+        if label is None or label == "" or (isinstance(label, float) and label != label):
+            return False
+        label = normalize_text(str(label))
+        if label in self._exact:
+            self._missing.discard(label)
+            return True
+        if self._matcher.find_all(label) or any(label in p for p in self.phrases):
+            return True
+        key = label_key(label)
+        return key in self._keys or self._fuzzy.best(key) is not None
+
+
+# ---------- Row resolution ----------
+def resolve_rows(df_index, targets, synonyms=None, substring=True):
+    """Map each key of `targets` ({key: phrase}) to a label of df_index, or None.
+
+    Exact match first, then the first label with the phrase's canonical key or
+    one of its known synonyms, then the closest label within max_edits()
+    edits, then the first label containing the phrase, then the first label
+    contained in the phrase (substring=False stops before these two). Every
+    label is normalized once and each pass is a single scan for all phrases,
+    so resolve a sheet once and reuse the mapping for all of its year columns.
+
+    Side effect: this persists the synonym table. New fuzzy matches are
+    added to `synonyms` (default: the synonym_table()) and the table is
+    saved to its file (SYNONYMS_FILE), so every feature extraction and every
+    code_mini/z_score.py run writes there whenever a label was new to it.
+    """
+    labels = [normalize_text(idx) for idx in df_index]
+    positions = [pos for pos, lab in enumerate(labels) if isinstance(lab, str)]
+    norm_targets = {key: normalize_text(phrase) for key, phrase in targets.items()}
+
+    exact = {}
+    for pos in positions:
+        exact.setdefault(labels[pos], pos)
+    resolved = {key: exact.get(target) for key, target in norm_targets.items()}
+    table = synonym_table() if synonyms is None else synonyms
+
+    by_key = {}
+    pending = [key for key, pos in resolved.items() if pos is None]
+    if pending:
+        # canonical key, then the variants accepted in earlier runs (one lookup each)
+        for pos in positions:
+            by_key.setdefault(label_key(labels[pos]), pos)
+        for key in pending:
+            target = norm_targets[key]
+            for candidate in [label_key(target), *table.variants(target)]:
+                if candidate in by_key:
+                    resolved[key] = by_key[candidate]
+                    break
+
+    pending = [key for key, pos in resolved.items() if pos is None]
+    if pending:
+        # fuzzy: closest label a few edits away, never one that is another phrase's label
+        keys = list(by_key)
+        index = FuzzyIndex(keys)
+        other_phrases = {label_key(t) for t in norm_targets.values()}
+        for key in pending:
+            target = norm_targets[key]
+            hit = index.best(label_key(target), lambda kid: keys[kid] not in other_phrases
+                             and not negation_differs(target, labels[by_key[keys[kid]]]))
+            if hit is not None:
+                resolved[key] = by_key[keys[hit[0]]]
+                table.add(target, labels[resolved[key]])
+        table.save()
+
+    pending = [key for key, pos in resolved.items() if pos is None and substring]
+    if pending:
+        # substring: first label that contains the phrase
+        phrases = sorted({norm_targets[key] for key in pending})
+        matcher = PhraseMatcher(phrases)
+        first_hit = {}
+        for pos in positions:
+            for pid in matcher.find_all(labels[pos]):
+                first_hit.setdefault(phrases[pid], pos)
+        for key in pending:
+            resolved[key] = first_hit.get(norm_targets[key])
+
+    pending = [key for key, pos in resolved.items() if pos is None and substring]
+    if pending:
+        # reverse: first label that is contained in the phrase (rare)
+        matcher = PhraseMatcher(labels[pos] for pos in positions)
+        for key in pending:
+            hits = matcher.find_all(norm_targets[key])
+            if hits:
+                resolved[key] = positions[min(hits)]
+
+    return {key: (None if pos is None else df_index[pos]) for key, pos in resolved.items()}
+
+
+def label_names(df_index, phrases, synonyms=None):
+    """{label of df_index: phrase} for rows that are one of `phrases`.
+
+    Exact, canonical-key, synonym or fuzzy matches only (no substring
+    fallback, so "نسبت بدهی" never stands in for "نسبت بدهی به ارزش ویژه");
+    a label two phrases resolve to is left out rather than given to either.
+    """
+    row_map = resolve_rows(df_index, {p: p for p in phrases}, synonyms, substring=False)
+    claimed = Counter(label for label in row_map.values() if label is not None)
+    return {label: phrase for phrase, label in row_map.items() if label is not None and claimed[label] == 1}
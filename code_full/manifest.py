@@ -0,0 +1,82 @@
+# manifest.py
+"""Content-hash manifest for incremental pipeline runs.
+
+pipeline_manifest.json (next to each stage's input) records a SHA-256 per
+source workbook and, for every stage and company, the hash of what the stage
+consumed and produced. A stage only rebuilds the companies whose input hash
+changed and splices their rows into the existing outputs.
+
+    {"sources": {"ترازنامه/دعبید ترازنامه.xlsx": "<sha256>", ...},
+     "stages": {"merge": {"دعبید": {"input": "...", "output": "..."}}, ...}}
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+MANIFEST_FILE = "pipeline_manifest.json"
+
+
+# ---------- Hashes ----------
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def combine_digests(parts):
+    """One digest for an ordered collection of (name, digest) pairs."""
+    h = hashlib.sha256()
+    for name, digest in parts:
+        h.update(f"{name}\0{digest}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def frame_digest(df):
+    """Content hash of a DataFrame (values, index and column labels)."""
+    h = hashlib.sha256()
+    h.update(repr([str(c) for c in df.columns]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df.astype(object), index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+# ---------- Manifest file ----------
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        manifest = {}
+    manifest.setdefault("sources", {})
+    manifest.setdefault("stages", {})
+    return manifest
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def stage_entry(manifest, stage, company):
+    """Recorded {"input": ..., "output": ...} of a stage for one company ({} if none)."""
+    return manifest["stages"].get(stage, {}).get(company, {})
+
+
+def record_stage(manifest, stage, company, input_digest, output_digest=None):
+    manifest["stages"].setdefault(stage, {})[company] = {"input": input_digest, "output": output_digest}
+
+
+def forget_missing(manifest, stage, companies):
+    """Drop entries of companies that no longer exist."""
+    entries = manifest["stages"].get(stage, {})
+    for company in list(entries):
+        if company not in companies:
+            del entries[company]
@@ -0,0 +1,172 @@
+# model_cv.py
+"""Parallel, cached cross-validation and fitting for the XGBoost trainers.
+
+The feature matrix is turned into one xgboost DMatrix; every fold trains on
+a slice of it, so the data is never converted again per fold. Folds run side
+by side in threads (xgboost releases the GIL while it trains) and each fold
+gets cores // folds threads, so together they use every core without
+oversubscribing. With a preprocessing spec (preprocess.py) the imputer and
+scaler are instead fitted on each fold's training rows, so no statistics of
+the held-out fold leak into training; each fold then builds its own DMatrix.
+
+Fold models, fold scores and final fits are stored in MODEL_CACHE_DIR under
+a key made of the data hash (features, target, groups) and the model
+parameters; rerunning an unchanged experiment loads them instead of
+training.
+
+Settings (environment variables):
+    RAHAVARD_MODEL_CACHE_DIR  cache directory (default: ~/.cache/uni_rahavard_models)
+    RAHAVARD_MODEL_CACHE=0    always train
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import r2_score
+from sklearn.model_selection import GroupKFold
+
+from manifest import frame_digest
+
+MODEL_CACHE_DIR = os.environ.get(
+    "RAHAVARD_MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "uni_rahavard_models"))
+MODEL_CACHE_ENABLED = os.environ.get("RAHAVARD_MODEL_CACHE", "1") != "0"
+
+# XGBRegressor keyword -> native xgboost parameter
+_NATIVE_NAMES = {"learning_rate": "eta", "random_state": "seed", "n_jobs": "nthread"}
+
+
+# ---------- Parameters ----------
+def booster_params(params):
+    """(native params, number of rounds) for XGBRegressor-style keyword arguments."""
+    native = {"objective": "reg:squarederror"}
+    rounds = 100
+    for key, value in params.items():
+        if key == "n_estimators":
+            rounds = int(value)
+        else:
+            native[_NATIVE_NAMES.get(key, key)] = value
+    return native, rounds
+
+
+def fold_threads(n_folds, cores=None):
+    """(parallel folds, xgboost threads per fold) for the cores of this machine."""
+    cores = cores or os.cpu_count() or 1
+    parallel = max(1, min(n_folds, cores))
+    return parallel, max(1, cores // parallel)
+
+
+# ---------- Cache ----------
+def experiment_key(X, y, groups, params, what):
+    """Hash of the data (features, target, groups) and everything that shapes the model."""
+    h = hashlib.sha256()
+    h.update(frame_digest(pd.DataFrame(X)).encode())
+    h.update(frame_digest(pd.DataFrame({"y": np.asarray(y), "g": np.asarray(groups, dtype=object)})).encode())
+    h.update(json.dumps({"params": params, "what": what, "xgboost": xgb.__version__},
+                        sort_keys=True, default=str).encode())
+    return h.hexdigest()[:24]
+
+
+def _cache_path(key, name):
+    return os.path.join(MODEL_CACHE_DIR, key, name)
+
+
+def _load_json(path):
+    if MODEL_CACHE_ENABLED and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def _save_json(path, data):
+    if not MODEL_CACHE_ENABLED:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def _save_model(booster, path):
+    if not MODEL_CACHE_ENABLED:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    booster.save_model(path + ".tmp.json")
+    os.replace(path + ".tmp.json", path)
+
+
+# ---------- Cross-validation ----------
+def _train_fold(dmatrix, y, params, rounds, train_idx, test_idx):
+    booster = xgb.train(params, dmatrix.slice(train_idx), num_boost_round=rounds)
+    pred = booster.predict(dmatrix.slice(test_idx))
+    return booster, r2_score(y[test_idx], pred)
+
+
+def _train_prepared(X, y, params, rounds, spec, train_idx, test_idx):
+    from preprocess import fit_transform_cached
+    _, X_train, X_test = fit_transform_cached(X.iloc[train_idx], X.iloc[test_idx], spec)
+    booster = xgb.train(params, xgb.DMatrix(X_train, label=y[train_idx]), num_boost_round=rounds)
+    return booster, r2_score(y[test_idx], booster.predict(xgb.DMatrix(X_test)))
+
+
+def cross_validate(X, y, groups, params, n_splits=5, cores=None, preprocess=None):
+    """R² of each GroupKFold fold for an XGBRegressor with `params` (cached, folds in parallel).
+
+    Always the GroupKFold(n_splits) folds. With preprocess=None, X is used
+    as given (one DMatrix sliced per fold) and the scores equal, for the
+    same seed, cross_val_score(XGBRegressor(**params), X, y,
+    cv=GroupKFold(n_splits), groups=groups).
+
+    With a `preprocess` spec (see preprocess.py), as every trainer passes,
+    each fold fits its own preprocessing (imputer, scaler, sparse-column
+    drop) on its training rows, applies it to its test rows and builds its
+    own DMatrix, so the scores differ from those of the bare regressor.
+    """
+    y = np.asarray(y, dtype="float64")
+    X = pd.DataFrame(X).reset_index(drop=True)
+    splits = list(GroupKFold(n_splits=n_splits).split(X, y, groups=groups))
+    what = f"cv{n_splits}" if preprocess is None else f"cv{n_splits}|{json.dumps(preprocess, sort_keys=True)}"
+    key = experiment_key(X, y, groups, params, what)
+    scores_path = _cache_path(key, "scores.json")
+    cached = _load_json(scores_path)
+    if cached is not None:
+        print(f"♻️ Cross-validation reused from cache ({key})")
+        return np.array(cached["scores"])
+
+    parallel, threads = fold_threads(len(splits), cores)
+    native, rounds = booster_params(params)
+    native["nthread"] = threads
+    if preprocess is None:
+        dmatrix = xgb.DMatrix(X, label=y, nthread=-1)  # built once, sliced per fold
+        train = lambda split: _train_fold(dmatrix, y, native, rounds, *split)
+    else:
+        train = lambda split: _train_prepared(X, y, native, rounds, preprocess, *split)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = list(executor.map(train, splits))
+    for i, (booster, _) in enumerate(results):
+        _save_model(booster, _cache_path(key, f"fold_{i}.json"))
+    scores = [float(score) for _, score in results]
+    _save_json(scores_path, {"scores": scores, "params": params, "n_splits": n_splits})
+    return np.array(scores)
+
+
+# ---------- Final fit ----------
+def fit_cached(X, y, params, groups=None):
+    """XGBRegressor(**params).fit(X, y), loaded from the cache when this exact fit was done before."""
+    from xgboost import XGBRegressor
+
+    groups = np.zeros(len(y)) if groups is None else groups
+    key = experiment_key(X, y, groups, params, "fit")
+    path = _cache_path(key, "model.json")
+    model = XGBRegressor(**params)
+    if MODEL_CACHE_ENABLED and os.path.exists(path):
+        model.load_model(path)
+        print(f"♻️ Model reused from cache ({key})")
+        return model
+    model.fit(X, y)
+    _save_model(model.get_booster(), path)
+    return model
@@ -0,0 +1,199 @@
+# model_search.py
+"""Hyperparameter search for the Z_next models (XGBoost and random forest).
+
+Random configurations are compared with company-grouped cross-validation
+(GroupKFold on Company) by successive halving: every trial is scored on the
+first fold, only the best 1/eta go on to more folds, and so on until the
+survivors have seen all folds. Bad trials are therefore dropped after one
+fold instead of costing a full CV. XGBoost trials train with early stopping,
+so the number of trees is found rather than fixed: the winner's n_estimators
+is the mean of its folds' best iterations. The early-stopping rows are a
+company-grouped share (ES_FRACTION) of each fold's training rows; the held-out
+fold is only ever used for the R² that ranks the trials.
+
+Each fold is preprocessed once (preprocess.fit_transform_cached, fitted on
+the fold's training rows only) and shared by every trial. All (trial, fold)
+fits of a round run in parallel threads, sized with model_cv.fold_threads()
+so the cores are not oversubscribed.
+"""
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+
+from model_cv import booster_params, fold_threads
+from preprocess import DEFAULT_SPEC, fit_transform_cached, split_frame
+
+# (kind, low, high) or ("choice", options)
+SEARCH_SPACES = {
+    "xgb": {
+        "max_depth": ("int", 2, 8),
+        "learning_rate": ("log", 0.01, 0.3),
+        "subsample": ("uniform", 0.6, 1.0),
+        "colsample_bytree": ("uniform", 0.5, 1.0),
+        "min_child_weight": ("log", 1.0, 20.0),
+        "reg_lambda": ("log", 0.1, 10.0),
+    },
+    "rf": {
+        "n_estimators": ("choice", [100, 200, 300, 500]),
+        "max_depth": ("choice", [4, 6, 8, 10, 14, None]),
+        "min_samples_leaf": ("int", 1, 10),
+        "max_features": ("uniform", 0.3, 1.0),
+    },
+}
+FIXED_PARAMS = {
+    "xgb": {"random_state": 42, "objective": "reg:squarederror"},
+    "rf": {"random_state": 42},
+}
+MAX_TREES = 2000  # upper bound for XGBoost; early stopping picks the real number
+ES_FRACTION = 0.2  # share of a fold's training companies held back for early stopping
+
+
+# ---------- Sampling ----------
+def sample_params(space, rng):
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == "choice":
+            params[name] = spec[1][rng.integers(len(spec[1]))]
+        elif kind == "int":
+            params[name] = int(rng.integers(spec[1], spec[2] + 1))
+        elif kind == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+        else:
+            params[name] = float(rng.uniform(spec[1], spec[2]))
+    return params
+
+
+# ---------- One fold of one trial ----------
+def _fit_xgb(fold, params, threads, early_stopping_rounds):
+    native, _ = booster_params(params)
+    native["nthread"] = threads
+    booster = xgb.train(native, fold["dfit"], num_boost_round=MAX_TREES,
+                        evals=[(fold["dstop"], "stop")], early_stopping_rounds=early_stopping_rounds,
+                        verbose_eval=False)
+    pred = booster.predict(fold["dtest"], iteration_range=(0, booster.best_iteration + 1))
+    return r2_score(fold["y_test"], pred), booster.best_iteration + 1
+
+
+def _fit_rf(fold, params, threads):
+    model = RandomForestRegressor(**params, n_jobs=threads)
+    model.fit(fold["X_train"], fold["y_train"])
+    return r2_score(fold["y_test"], model.predict(fold["X_test"])), params["n_estimators"]
+
+
+def _prepare_folds(X, y, groups, splits, model, preprocess, seed):
+    """Per fold: the preprocessing fitted on its training rows applied to both parts.
+
+    For xgb also DMatrices: the fit and early-stopping parts of the training
+    rows (split by company) and the untouched test fold.
+    """
+    groups = np.asarray(groups)
+    folds = []
+    for train_idx, test_idx in splits:
+        _, X_train, X_test = fit_transform_cached(X.iloc[train_idx], X.iloc[test_idx], preprocess)
+        fold = {"X_train": X_train, "X_test": X_test, "y_train": y[train_idx], "y_test": y[test_idx]}
+        if model == "xgb":
+            splitter = GroupShuffleSplit(n_splits=1, test_size=ES_FRACTION, random_state=seed)
+            fit_pos, stop_pos = next(splitter.split(X_train, groups=groups[train_idx]))
+            fold["dfit"] = xgb.DMatrix(X_train.iloc[fit_pos], label=fold["y_train"][fit_pos], nthread=-1)
+            fold["dstop"] = xgb.DMatrix(X_train.iloc[stop_pos], label=fold["y_train"][stop_pos], nthread=-1)
+            fold["dtest"] = xgb.DMatrix(X_test, nthread=-1)
+        folds.append(fold)
+    return folds
+
+
+# ---------- Search ----------
+def search(X, y, groups, model="xgb", n_trials=30, n_splits=5, eta=3, cores=None, seed=42,
+           early_stopping_rounds=30, preprocess=DEFAULT_SPEC):
+    """Successive-halving search; returns (best params for the trainer, trials table).
+
+    The trials table has one row per trial: its parameters, how many folds
+    it reached, its mean R² over them and (XGBoost) its mean best iteration.
+    X is the raw feature frame; `preprocess` is the spec fitted inside each fold.
+    """
+    X = pd.DataFrame(X).reset_index(drop=True)
+    y = np.asarray(y, dtype="float64")
+    splits = list(GroupKFold(n_splits=n_splits).split(X, y, groups=groups))
+    rng = np.random.default_rng(seed)
+    trials = [{**sample_params(SEARCH_SPACES[model], rng), **FIXED_PARAMS[model]} for _ in range(n_trials)]
+    scores = [[] for _ in trials]
+    trees = [[] for _ in trials]
+    fold_data = _prepare_folds(X, y, groups, splits, model, preprocess, seed)
+
+    # folds seen after each round: 1, eta, eta², ... up to n_splits
+    rungs = []
+    folds = 1
+    while folds < n_splits:
+        rungs.append(folds)
+        folds *= eta
+    rungs.append(n_splits)
+
+    alive = list(range(len(trials)))
+    for rung, folds in enumerate(rungs):
+        tasks = [(t, f) for t in alive for f in range(len(scores[t]), folds)]
+        parallel, threads = fold_threads(len(tasks), cores)
+
+        def run(task):
+            t, f = task
+            if model == "xgb":
+                return _fit_xgb(fold_data[f], trials[t], threads, early_stopping_rounds)
+            return _fit_rf(fold_data[f], trials[t], threads)
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            for (t, _), (score, n_trees) in zip(tasks, executor.map(run, tasks)):
+                scores[t].append(score)
+                trees[t].append(n_trees)
+
+        alive.sort(key=lambda t: np.mean(scores[t]), reverse=True)
+        if rung < len(rungs) - 1:
+            alive = alive[:max(1, math.ceil(len(alive) / eta))]
+        print(f"  🔎 round {rung + 1}/{len(rungs)}: {len(tasks)} fits on {folds} fold(s), "
+              f"best mean R² {np.mean(scores[alive[0]]):.4f}, {len(alive)} trial(s) kept")
+
+    table = pd.DataFrame(trials)
+    table["folds"] = [len(s) for s in scores]
+    table["mean_R2"] = [np.mean(s) for s in scores]
+    table["mean_trees"] = [np.mean(t) for t in trees]
+    table = table.sort_values(["folds", "mean_R2"], ascending=False).reset_index(drop=True)
+
+    best = alive[0]
+    best_params = dict(trials[best])
+    if model == "xgb":
+        best_params["n_estimators"] = int(round(np.mean(trees[best])))
+    return best_params, table
+
+
+def save_params(params, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_params(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_search(df, out_dir, model="xgb", n_trials=30, cores=None, preprocess=DEFAULT_SPEC):
+    """Search on an ML-ready frame (grouped by its Company column); writes
+    best_params_<model>.json and search_trials_<model>.csv to out_dir and returns the best params.
+    Pass the preprocessing spec the final model is trained with."""
+    X, y, groups = split_frame(df)
+    print(f"\n🔎 {model} search: {n_trials} trials, company-grouped 5-fold CV "
+          f"({pd.Series(groups).nunique()} groups)")
+    best_params, table = search(X, y, groups, model, n_trials, cores=cores, preprocess=preprocess)
+
+    os.makedirs(out_dir, exist_ok=True)
+    params_path = os.path.join(out_dir, f"best_params_{model}.json")
+    save_params(best_params, params_path)
+    table.to_csv(os.path.join(out_dir, f"search_trials_{model}.csv"), index=False, encoding="utf-8-sig")
+    print(f"🏆 Best parameters (mean R² {table.loc[0, 'mean_R2']:.4f}): {best_params}")
+    print(f"💾 Saved: {params_path}")
+    return best_params
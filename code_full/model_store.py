@@ -0,0 +1,206 @@
+# model_store.py
+"""Versioned Z_next model bundles, batch scoring and a small local HTTP endpoint.
+
+A bundle is everything needed to score new company-years without retraining:
+
+    <store>/<name>/v0003/
+        preprocess.joblib   fitted imputer + scaler (sklearn Pipeline)
+        model.json          XGBoost booster
+        meta.json           feature columns, parameters, metrics, model hash, created
+
+save_bundle() adds a version only when the model differs from the latest one.
+load_bundle() loads a version (default: latest) once; score() then runs the
+whole features table through it in vectorized batches.
+
+    python code_full/pipeline.py score  <..._WithZ.xlsx> [--model-dir DIR] [-o predictions.csv]
+    python code_full/pipeline.py serve  --model-dir DIR [--port 8765]
+
+The server keeps the bundle in memory: POST /predict with a JSON list of
+rows (feature name -> value) returns {"predictions": [...]}; GET /health
+returns the bundle's meta.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_NAME = "z_next"
+BATCH_ROWS = 50000
+_VERSION = re.compile(r'^v(\d+)$')
+
+
+# ---------- Versions ----------
+def versions(store_dir, name=DEFAULT_NAME):
+    """Version numbers present in the store, oldest first."""
+    folder = os.path.join(store_dir, name)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(m.group(1)) for m in map(_VERSION.match, os.listdir(folder)) if m)
+
+
+def bundle_path(store_dir, name=DEFAULT_NAME, version=None):
+    found = versions(store_dir, name)
+    if not found:
+        raise FileNotFoundError(f"No '{name}' model in {store_dir}")
+    version = found[-1] if version is None else int(version)
+    return os.path.join(store_dir, name, f"v{version:04d}")
+
+
+# ---------- Save / load ----------
+def _model_digest(model):
+    return hashlib.sha256(bytes(model.get_booster().save_raw("ubj"))).hexdigest()
+
+
+def save_bundle(store_dir, preprocess, model, features, meta=None, name=DEFAULT_NAME):
+    """Store a fitted preprocess + XGBRegressor as a new version; returns its folder.
+
+    If the latest version holds the very same booster, that folder is returned
+    instead of writing a copy.
+    """
+    import joblib
+
+    digest = _model_digest(model)
+    found = versions(store_dir, name)
+    if found:
+        latest = bundle_path(store_dir, name, found[-1])
+        with open(os.path.join(latest, "meta.json"), encoding="utf-8") as f:
+            if json.load(f).get("model_sha256") == digest:
+                return latest
+
+    folder = os.path.join(store_dir, name, f"v{(found[-1] if found else 0) + 1:04d}")
+    os.makedirs(folder + ".tmp", exist_ok=True)
+    joblib.dump(preprocess, os.path.join(folder + ".tmp", "preprocess.joblib"))
+    model.get_booster().save_model(os.path.join(folder + ".tmp", "model.json"))
+    full_meta = {
+        "name": name,
+        "version": os.path.basename(folder),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "features": list(features),
+        "model_sha256": digest,
+        **(meta or {}),
+    }
+    with open(os.path.join(folder + ".tmp", "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(full_meta, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(folder + ".tmp", folder)
+    return folder
+
+
+def load_bundle(store_dir, name=DEFAULT_NAME, version=None):
+    """{"preprocess", "booster", "meta", "path"} of one stored version (default: latest)."""
+    import joblib
+    import xgboost as xgb
+
+    folder = bundle_path(store_dir, name, version)
+    booster = xgb.Booster()
+    booster.load_model(os.path.join(folder, "model.json"))
+    with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    preprocess = joblib.load(os.path.join(folder, "preprocess.joblib"))
+    preprocess.set_output(transform="pandas")  # keep feature names between the steps
+    return {"preprocess": preprocess, "booster": booster, "meta": meta, "path": folder}
+
+
+# ---------- Scoring ----------
+def feature_matrix(bundle, df):
+    """The bundle's feature columns from df (missing ones as NaN, Year_num from Year,
+    lag / rolling columns computed from the company panel when the model uses them)."""
+    from panel_features import add_panel_features, panel_feature_names
+
+    df = pd.DataFrame(df)
+    features = bundle["meta"]["features"]
+    if "Year_num" in features and "Year_num" not in df.columns and "Year" in df.columns:
+        df = df.assign(Year_num=pd.to_numeric(df["Year"], errors="coerce"))
+    missing = set(features) - set(df.columns)
+    if missing & set(panel_feature_names()) and "Year" in df.columns:
+        df = add_panel_features(df)
+    X = df.reindex(columns=features)
+    return X.apply(pd.to_numeric, errors="coerce")
+
+
+def score(bundle, df, batch_rows=BATCH_ROWS):
+    """Predicted Z_next for every row of df (numpy array), in batches of batch_rows."""
+    X = feature_matrix(bundle, df)
+    out = np.empty(len(X), dtype="float64")
+    for i in range(0, len(X), batch_rows):
+        batch = bundle["preprocess"].transform(X.iloc[i:i + batch_rows])
+        out[i:i + batch_rows] = bundle["booster"].inplace_predict(np.asarray(batch, dtype="float32"))
+    return out
+
+
+def run_score(features_file, store_dir, output_file=None, version=None):
+    """Score a features table with a stored bundle; writes Company, Year, Z_next_pred (CSV/XLSX/Parquet)."""
+    from excel_cache import read_excel_cached
+
+    bundle = load_bundle(store_dir, version=version)
+    df = read_excel_cached(features_file)
+    start = time.perf_counter()
+    pred = score(bundle, df)
+    print(f"🔮 Scored {len(df)} rows with {bundle['meta']['version']} in {time.perf_counter() - start:.3f}s")
+
+    keys = [c for c in ["Company", "Year"] if c in df.columns]
+    result = df[keys].copy()
+    result["Z_next_pred"] = pred
+    output_file = output_file or os.path.splitext(features_file)[0] + "_predictions.csv"
+    if output_file.lower().endswith(".parquet"):
+        result.to_parquet(output_file, index=False)
+    elif output_file.lower().endswith(".xlsx"):
+        result.to_excel(output_file, index=False)
+    else:
+        result.to_csv(output_file, index=False, encoding="utf-8-sig")
+    print(f"💾 Predictions saved to: {output_file}")
+    return output_file
+
+
+# ---------- HTTP endpoint ----------
+def serve(store_dir, host="127.0.0.1", port=8765, version=None):
+    """Keep one bundle loaded and answer POST /predict and GET /health until interrupted."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    bundle = load_bundle(store_dir, version=version)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._reply(200, bundle["meta"])
+            else:
+                self._reply(404, {"error": "use GET /health or POST /predict"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/predict":
+                self._reply(404, {"error": "use POST /predict"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+                rows = payload.get("rows", []) if isinstance(payload, dict) else payload
+                pred = score(bundle, pd.DataFrame(rows))
+            except Exception as e:  # bad rows must not drop the connection (e.g. XGBoostError)
+                self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._reply(200, {"version": bundle["meta"]["version"],
+                              "predictions": [None if np.isnan(p) else float(p) for p in pred]})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🌐 Serving {bundle['meta']['name']} {bundle['meta']['version']} on http://{host}:{port} "
+          f"(POST /predict, GET /health) — Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,95 @@
+# numeric.py
+"""Parsing of Rahavard figures: Persian/Arabic digits, thousands separators, (negatives)."""
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# map Persian/Arabic digits to ASCII digits
+PERSIAN_DIGITS = {ord(x): ord(y) for x, y in zip(
+    "۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")}
+
+
+def to_number(x):
+    """Convert a cell to float if possible: handle Persian digits, commas, parentheses for negatives."""
+    if pd.isna(x):
+        return float('nan')
+    s = str(x).strip()
+    if s == '':
+        return float('nan')
+    # replace Persian/Arabic digits
+    s = s.translate(PERSIAN_DIGITS)
+    # remove currency symbols or non-numeric letters
+    s = s.replace(',', '').replace('٬', '')  # comma variants
+    s = s.replace(' ', '')
+    # handle parentheses negative e.g. (123) => -123
+    if re.match(r'^\(.*\)$', s):
+        s = '-' + s[1:-1]
+    # if s contains non-digit except - and ., coerce
+    try:
+        return pd.to_numeric(s, errors='coerce')
+    except:
+        return float('nan')
+
+
+def to_number_series(series):
+    """Vectorized to_number over a whole column; same values as series.map(to_number)."""
+    if is_bool_dtype(series.dtype):
+        # str(True) is not a number
+        return pd.Series(np.nan, index=series.index, name=series.name)
+    if is_numeric_dtype(series.dtype):
+        return series.copy()
+
+    s = series.astype(object).where(series.notna(), '')
+    s = s.astype(str).str.strip()
+    s = s.str.translate(PERSIAN_DIGITS)
+    s = s.str.replace(',', '', regex=False).str.replace('٬', '', regex=False)
+    s = s.str.replace(' ', '', regex=False)
+    paren = s.str.match(r'^\(.*\)$')
+    s = s.where(~paren, '-' + s.str[1:-1])
+
+    out = pd.to_numeric(s, errors='coerce')
+    if out.dtype.kind == 'f':
+        # to_number parses integer literals as int64 before they land in a float
+        # column; the float parser differs for "-0" and for ints above 2**53.
+        is_int = s.str.fullmatch(r'[+-]?[0-9]+')
+        out[is_int & (out == 0)] = 0.0
+        long_int = is_int & (s.str.len() > 15)
+        if long_int.any():
+            out[long_int] = s[long_int].map(_int_literal_to_float)
+    return out
+
+
+def _int_literal_to_float(text):
+    value = int(text)
+    if -2**63 <= value < 2**64:
+        return float(value)
+    return float(pd.to_numeric(text, errors='coerce'))
+
+
+def to_number_frame(df):
+    """Vectorized to_number over a whole frame.
+
+    Text/mixed columns are stacked into one long Series and parsed in a single
+    pass, so the cost does not grow with the number of (small) year columns.
+    """
+    dtypes = list(df.dtypes)
+    text_cols = [pos for pos, dtype in enumerate(dtypes) if not is_numeric_dtype(dtype)]
+    parsed = None
+    if text_cols:
+        block = df.iloc[:, text_cols].to_numpy(dtype=object)
+        parsed = to_number_series(pd.Series(block.ravel(order='F'), dtype=object))
+        parsed = parsed.to_numpy(dtype='float64').reshape(block.shape, order='F')
+
+    columns = {}
+    for pos, dtype in enumerate(dtypes):
+        if is_bool_dtype(dtype):
+            columns[pos] = np.full(len(df), np.nan)
+        elif is_numeric_dtype(dtype):
+            columns[pos] = df.iloc[:, pos].to_numpy(copy=True)
+        else:
+            columns[pos] = parsed[:, text_cols.index(pos)]
+    out = pd.DataFrame(columns, index=df.index)
+    out.columns = df.columns
+    return out
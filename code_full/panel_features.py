@@ -0,0 +1,89 @@
+# panel_features.py
+"""Lag, year-over-year and rolling-window features over the company panel.
+
+For every variable in PANEL_VARS (X1..X5, ROA, ROE, DebtRatio, Altman_Z):
+
+    <v>_lag1, <v>_lag2            value of year t-1, t-2 of the same company
+    <v>_diff1                     v(t) - v(t-1)
+    <v>_growth1                   (v(t) - v(t-1)) / |v(t-1)|   (NaN when v(t-1) is 0 or missing)
+    <v>_roll3_mean, <v>_roll3_std over years t-2..t (at least min_periods values)
+
+The table is sorted once by (Company, year); every lag is then one shift of
+the whole column, kept only where the row k places back is the same company
+and exactly year t-k, so a missing year gives NaN instead of an older value.
+Rolling windows are built from those lags, so nothing loops over companies
+and the cost grows linearly with the rows. Rows keep their input order.
+Windows end at year t, so no feature looks past the row's own year.
+"""
+import numpy as np
+import pandas as pd
+
+from altman import X_COLS, safe_divide
+
+PANEL_VARS = X_COLS + ["ROA", "ROE", "DebtRatio", "Altman_Z"]
+LAGS = (1, 2)
+WINDOWS = (3,)
+
+
+def panel_feature_names(variables=PANEL_VARS, lags=LAGS, windows=WINDOWS):
+    names = []
+    for v in variables:
+        names += [f"{v}_lag{k}" for k in lags] + [f"{v}_diff1", f"{v}_growth1"]
+        for w in windows:
+            names += [f"{v}_roll{w}_mean", f"{v}_roll{w}_std"]
+    return names
+
+
+# ---------- Lags on the sorted panel ----------
+def _years_back(codes, year, k):
+    """Row (sorted panel) holding the same company's year t-k, or -1.
+
+    With gaps in a company's years, year t-k sits at most k rows back.
+    """
+    n = len(year)
+    source = np.full(n, -1)
+    for j in range(1, k + 1):
+        rows = np.arange(j, n)
+        hit = (codes[rows] == codes[rows - j]) & (year[rows - j] == year[rows] - k) & (source[rows] < 0)
+        source[rows[hit]] = rows[hit] - j
+    return source
+
+
+def _rolling(past, window, min_periods):
+    """Mean and sample std over the current and window-1 previous years (NaN-aware)."""
+    stack = np.vstack([past[k] for k in range(window)])
+    valid = ~np.isnan(stack)
+    count = valid.sum(axis=0)
+    mean = safe_divide(np.where(valid, stack, 0.0).sum(axis=0), count)
+    squares = (np.where(valid, stack - mean, 0.0) ** 2).sum(axis=0)
+    std = np.sqrt(safe_divide(squares, np.maximum(count - 1, 0)))
+    enough = count >= min_periods
+    return np.where(enough, mean, np.nan), np.where(enough, std, np.nan)
+
+
+# ---------- Features ----------
+def add_panel_features(df, variables=PANEL_VARS, lags=LAGS, windows=WINDOWS, min_periods=2):
+    """df with the lag / delta / growth / rolling columns of `variables` added (missing ones skipped)."""
+    year = pd.to_numeric(df['Year_num'] if 'Year_num' in df.columns else df['Year'], errors='coerce')
+    year = year.to_numpy(dtype='float64')
+    codes = pd.factorize(df['Company'])[0] if 'Company' in df.columns else np.zeros(len(df), dtype=int)
+    order = np.lexsort((year, codes))  # one sort: company, then year
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+
+    depth = max(max(lags, default=1), max(windows, default=1) - 1, 1)
+    back = {k: _years_back(codes[order], year[order], k) for k in range(1, depth + 1)}
+
+    new = {}
+    for v in [v for v in variables if v in df.columns]:
+        x = pd.to_numeric(df[v], errors='coerce').to_numpy(dtype='float64')[order]
+        past = {0: x, **{k: np.where(src >= 0, x[src], np.nan) for k, src in back.items()}}
+        for k in lags:
+            new[f"{v}_lag{k}"] = past[k]
+        new[f"{v}_diff1"] = x - past[1]
+        new[f"{v}_growth1"] = safe_divide(x - past[1], np.abs(past[1]))
+        for w in windows:
+            new[f"{v}_roll{w}_mean"], new[f"{v}_roll{w}_std"] = _rolling(past, w, min_periods)
+
+    features = pd.DataFrame({name: values[inverse] for name, values in new.items()}, index=df.index)
+    return pd.concat([df.drop(columns=[c for c in features.columns if c in df.columns]), features], axis=1)
@@ -0,0 +1,172 @@
+# panel_stats.py
+"""Descriptive statistics and correlations of the key variables for every company.
+
+code_mini/analysis.py does this for one hand-picked _Merged.xlsx file. Here
+the same 20 variables are taken from the tidy store (Merged_All_tidy.parquet)
+for all companies at once, pivoted into one (company, period) × variable
+panel, and every statistic is a single groupby over that panel. A pooled
+row set ("ALL", every company-year together) is added to each table.
+
+Output is one workbook (Descriptive / Pearson / Spearman sheets, colored
+like analysis.py's report) or, for a
+.parquet output name, one columnar table keyed by (Company, Variable).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from labels import normalize_text
+from profiling import current, profiled, write_report
+from tidy_store import TIDY_FILE, read_tidy
+from xlsx_writer import CORRELATION_RULES, SIGN_RULES, color_frame
+
+POOLED = "ALL"
+
+# same 20 variables as code_mini/analysis.py
+STAT_VARS = [
+    "جمع دارایی‌های جاری",
+    "جمع کل دارایی‌ها",
+    "جمع بدهی‌های جاری",
+    "جمع کل بدهی‌ها",
+    "جمع حقوق صاحبان سهام",
+    "جمع درآمدها",
+    "سود (زیان) عملیاتی",
+    "سود (زیان) ویژه پس از کسر مالیات",
+    "سود و زیان انباشته در پایان دوره",
+    "نسبت جاری",
+    "نسبت آنی",
+    "نسبت بدهی",
+    "نسبت بدهی به ارزش ویژه",
+    "بازده دارایی‌ها ROA",
+    "بازدهی سرمایه ROE",
+    "گردش موجودی کالا",
+    "گردش دارایی‌های ثابت",
+    "گردش مجموع دارایی‌ها",
+    "سود ناخالص به فروش",
+    "سود خالص به فروش",
+]
+
+DESC_COLS = ["Count", "Mean", "Std", "Min", "25%", "50%", "75%", "Max", "Skewness", "Kurtosis"]
+
+
+# ---------- Panel ----------
+def load_panel(tidy_path, variables=STAT_VARS):
+    """(company, period) × variable frame of the tidy store's values.
+
+    Labels are matched exactly after normalization, like analysis.py's isin();
+    if a company has the same label twice, its first row wins (as in the
+    merged sheet).
+    """
+    names = {normalize_text(v): v for v in variables}
+    tidy = read_tidy(tidy_path, labels=list(names))
+    tidy = tidy.drop_duplicates(["company", "normalized_label", "period"], keep="first")
+    companies = pd.unique(tidy["company"])
+    panel = tidy.pivot(index=["company", "period"], columns="normalized_label", values="value")
+    panel = panel.reindex(columns=list(names)).rename(columns=names)
+    # companies in store order, periods in calendar order
+    panel = panel.reindex(pd.MultiIndex.from_product([companies, sorted(pd.unique(tidy["period"]))],
+                                                     names=["company", "period"]))
+    panel = panel.dropna(how="all")
+    panel.columns.name = "Variable"
+    return panel
+
+
+# ---------- Descriptive statistics ----------
+def describe_groups(panel, keys):
+    """analysis.py's table (DESC_COLS) for every group of `keys`, variables in rows.
+
+    Skewness and kurtosis use pandas' bias-corrected formulas, computed from
+    grouped central moments so that they too are one groupby each.
+    """
+    grouped = panel.groupby(keys, sort=False)
+    n = grouped.count()
+    mean = grouped.mean()
+    dev = panel - grouped.transform("mean")
+    m2 = (dev ** 2).groupby(keys, sort=False).sum()
+    m3 = (dev ** 3).groupby(keys, sort=False).sum()
+    m4 = (dev ** 4).groupby(keys, sort=False).sum()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        skew = np.sqrt(n * (n - 1)) / (n - 2) * (m3 / n) / (m2 / n) ** 1.5
+        kurt = (n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 ** 2)
+                - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+    # constant series: pandas reports 0, too few values: NaN
+    flat = m2 <= 1e-14 * (mean ** 2).clip(lower=1.0) * n
+    skew = skew.mask(flat, 0.0).where(n >= 3)
+    kurt = kurt.mask(flat, 0.0).where(n >= 4)
+
+    quantiles = grouped.quantile([0.25, 0.5, 0.75])
+    parts = [n, mean, grouped.std(), grouped.min(),
+             quantiles.xs(0.25, level=-1), quantiles.xs(0.5, level=-1), quantiles.xs(0.75, level=-1),
+             grouped.max(), skew, kurt]
+    table = pd.concat([part.stack(future_stack=True) for part in parts], axis=1, keys=DESC_COLS)
+    table.index.names = ["Company", "Variable"]
+    return table
+
+
+def describe_panel(panel):
+    """Per-company tables followed by the pooled one."""
+    companies = panel.index.get_level_values("company")
+    pooled = np.full(len(panel), POOLED, dtype=object)
+    return pd.concat([describe_groups(panel, companies), describe_groups(panel, pooled)])
+
+
+# ---------- Correlation ----------
+def correlate_panel(panel, method="pearson"):
+    """Per-company and pooled correlation matrices, stacked with (Company, Variable) rows."""
+    companies = panel.index.get_level_values("company")
+    per_company = panel.groupby(companies, sort=False).corr(method=method)
+    pooled = pd.concat({POOLED: panel.corr(method=method)})
+    table = pd.concat([per_company, pooled])
+    table.index.names = ["Company", "Variable"]
+    table.columns.name = None
+    return table
+
+
+# ---------- Run ----------
+@profiled("stats")
+def run_panel_stats(tidy_path, output_file):
+    """Write the descriptive, Pearson and Spearman tables of every company; returns output_file."""
+    if os.path.isdir(tidy_path):
+        tidy_path = os.path.join(tidy_path, TIDY_FILE)
+    panel = load_panel(tidy_path)
+    n_companies = panel.index.get_level_values("company").nunique()
+    print(f"📊 Panel: {n_companies} companies, {len(panel)} company-years, {panel.shape[1]} variables")
+
+    desc = describe_panel(panel)
+    pearson = correlate_panel(panel, "pearson")
+    spearman = correlate_panel(panel, "spearman")
+    current().update(companies=n_companies, rows=len(panel))
+
+    if output_file.lower().endswith(".parquet"):
+        # one columnar table: the three tables share the (Company, Variable) key
+        table = pd.concat([desc, pearson.add_prefix("pearson: "), spearman.add_prefix("spearman: ")], axis=1)
+        table.reset_index().to_parquet(output_file, index=False)
+    else:
+        with pd.ExcelWriter(output_file) as writer:
+            desc.to_excel(writer, sheet_name="Descriptive")
+            pearson.to_excel(writer, sheet_name="Pearson")
+            spearman.to_excel(writer, sheet_name="Spearman")
+            color_frame(writer, "Descriptive", desc, SIGN_RULES, skip_cols=1)
+            color_frame(writer, "Pearson", pearson, CORRELATION_RULES)
+            color_frame(writer, "Spearman", spearman, CORRELATION_RULES)
+    print("✅ Descriptive statistics and correlations saved →", output_file)
+    return output_file
+
+
+def main():
+    print("Run the merge step first; this reads its Merged_All_tidy.parquet.")
+    tidy_path = input("Enter the tidy store (or the main data folder): ").strip()
+    if not os.path.exists(tidy_path):
+        print("File not found. Exiting.")
+        return
+    base = tidy_path if os.path.isdir(tidy_path) else os.path.dirname(os.path.abspath(tidy_path))
+    output_file = input("Output file (.xlsx or .parquet) [Panel_Stats.xlsx]: ").strip() \
+        or os.path.join(base, "Panel_Stats.xlsx")
+    run_panel_stats(tidy_path, output_file)
+    write_report(base)
+
+
+if __name__ == "__main__":
+    main()
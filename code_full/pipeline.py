@@ -0,0 +1,291 @@
+# pipeline.py
+"""Non-interactive entry point for the whole pipeline.
+
+    python code_full/pipeline.py merge    <main_dir> [--workers N] [--incremental]
+    python code_full/pipeline.py clean    <main_dir> [--incremental]
+    python code_full/pipeline.py features <Merged_All.xlsx | Merged_All_tidy.parquet> [--out-dir DIR] [--incremental]
+    python code_full/pipeline.py zscore   <..._Cleaned_Features.xlsx> [--incremental] [--panel-features]
+    python code_full/pipeline.py zreport  <..._Cleaned_Features.xlsx> [--out-dir DIR] [--workers N] [--consolidated]
+    python code_full/pipeline.py tune     <..._ML_ready.xlsx> [--model xgb|rf] [--trials N] [--workers N]
+    python code_full/pipeline.py train    <..._ML_ready.xlsx> [--plots-dir DIR] [--params best_params_xgb.json]
+                                                            [--shap-background N] [--model-dir DIR]
+    python code_full/pipeline.py backtest <..._ML_ready.xlsx> [-o Backtest.xlsx] [--params best_params_xgb.json]
+                                                            [--min-train-years 3] [--step-rounds 50] [--chain-years N] [--refit]
+    python code_full/pipeline.py score    <..._WithZ.xlsx> [--model-dir DIR] [--version N] [-o predictions.csv]
+    python code_full/pipeline.py serve    --model-dir DIR [--version N] [--host H] [--port 8765]
+    python code_full/pipeline.py analyze  <company>_Merged.xlsx [-o OUTPUT]
+    python code_full/pipeline.py stats    <Merged_All_tidy.parquet | main_dir> [-o Panel_Stats.xlsx|.parquet]
+    python code_full/pipeline.py all      <main_dir> [--workers N] [--incremental] [--panel-features] [--train]
+    python code_full/pipeline.py --profile <command> ...   (also writes run_report.json/.csv)
+
+`all` runs merge → clean → features → zscore (→ train) in one process; each
+stage still writes its usual files, but the next stage takes the frames from
+memory instead of parsing those workbooks again.
+"""
+import argparse
+import os
+import sys
+
+import profiling
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _workers(value):
+    workers = int(value)
+    return (os.cpu_count() or 1) if workers == 0 else workers
+
+
+def _import_from(folder, module):
+    """Import one of the scripts kept outside code_full (start_of_Ml, code_mini)."""
+    path = os.path.join(HERE, "..", folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return __import__(module)
+
+
+def default_model_dir(path):
+    """Model store next to the data: <dir of path>/models."""
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "models")
+
+
+# ---------- Subcommands ----------
+def cmd_merge(args):
+    from combine_all import run_merge
+    run_merge(args.main_dir, args.workers, args.incremental)
+
+
+def cmd_clean(args):
+    from edit_all import run_clean
+    if run_clean(args.main_dir, args.incremental) is None:
+        return 1
+
+
+def cmd_features(args):
+    from build_features import build_features
+    build_features(args.file, args.out_dir, args.incremental)
+
+
+def cmd_zscore(args):
+    from compute_z_and_target import run_zscore
+    run_zscore(args.file, args.incremental, panel_features=args.panel_features)
+
+
+def cmd_zreport(args):
+    from z_reports import run_z_reports
+    run_z_reports(args.file, args.out_dir, args.workers, args.consolidated)
+
+
+def cmd_train(args, df=None):
+    import matplotlib
+    matplotlib.use("Agg")  # never open windows from the command line
+    from excel_cache import read_excel_cached
+    trainer = _import_from("start_of_Ml", "xg_boost_with_eval")
+    if df is None:
+        df = read_excel_cached(args.file)
+        print(f"\n✅ Data Loaded. Shape: {df.shape}")
+    plots_dir = args.plots_dir or os.path.join(os.path.dirname(os.path.abspath(args.file)), "plots")
+    model_dir = getattr(args, "model_dir", None) or default_model_dir(args.file)
+    params = None
+    if getattr(args, "params", None):
+        from model_search import load_params
+        params = load_params(args.params)
+    with profiling.profile("train") as rec:
+        rec["rows"] = len(df)
+        trainer.run_train(df, plots_dir, params, getattr(args, "shap_background", 100), model_dir)
+    print(f"🖼️ Plots saved in: {plots_dir}")
+
+
+def cmd_tune(args):
+    from excel_cache import read_excel_cached
+    from model_search import run_search
+    df = read_excel_cached(args.file)
+    out_dir = args.out_dir or os.path.dirname(os.path.abspath(args.file))
+    with profiling.profile("tune") as rec:
+        rec["rows"] = len(df)
+        run_search(df, out_dir, args.model, args.trials, args.workers)
+
+
+def cmd_backtest(args):
+    from backtest import run_backtest
+    from excel_cache import read_excel_cached
+    df = read_excel_cached(args.file)
+    params = None
+    if args.params:
+        from model_search import load_params
+        params = load_params(args.params)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.file)), "Backtest.xlsx")
+    run_backtest(df, output, params, args.min_train_years, args.step_rounds, not args.refit, args.workers,
+                 args.chain_years)
+
+
+def cmd_score(args):
+    from model_store import run_score
+    run_score(args.file, args.model_dir or default_model_dir(args.file), args.output, args.version)
+
+
+def cmd_serve(args):
+    from model_store import serve
+    serve(args.model_dir, args.host, args.port, args.version)
+
+
+def cmd_analyze(args):
+    analysis = _import_from("code_mini", "analysis")
+    output = args.output or os.path.splitext(args.file)[0] + "_Analysis.xlsx"
+    with profiling.profile("analyze", os.path.basename(args.file)):
+        analysis.run_analysis(args.file, output)
+
+
+def cmd_stats(args):
+    from panel_stats import run_panel_stats
+    base = args.file if os.path.isdir(args.file) else os.path.dirname(os.path.abspath(args.file))
+    run_panel_stats(args.file, args.output or os.path.join(base, "Panel_Stats.xlsx"))
+
+
+def cmd_all(args):
+    from build_features import build_features
+    from combine_all import run_merge
+    from compute_z_and_target import run_zscore
+    from edit_all import run_clean
+
+    memory = {}
+    print("\n===== 1/4 merge =====")
+    run_merge(args.main_dir, args.workers, args.incremental, memory=memory)
+    print("\n===== 2/4 clean =====")
+    merged_all = run_clean(args.main_dir, args.incremental, memory=memory)
+    if merged_all is None:
+        return 1
+    print("\n===== 3/4 features =====")
+    features = build_features(merged_all, args.main_dir, args.incremental, memory=memory)
+    memory.pop("merged", None)
+    print("\n===== 4/4 zscore =====")
+    ml_ready = run_zscore(features, args.incremental, memory=memory, panel_features=args.panel_features)
+    if args.train:
+        print("\n===== train =====")
+        args.file = ml_ready
+        cmd_train(args, df=memory["ml_ready"])
+
+
+# ---------- Argument parsing ----------
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pipeline.py", description="Rahavard financial-statement pipeline")
+    parser.add_argument("--profile", action="store_true",
+                        help="record time/CPU/peak memory per stage and company into run_report.json/.csv")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("merge", help="merge each company's statements (combine_all.py)")
+    p.add_argument("main_dir")
+    p.add_argument("--workers", type=_workers, default=1, help="worker processes (0 = all cores)")
+    p.add_argument("--incremental", action="store_true", help="only re-merge companies whose sources changed")
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("clean", help="drop unwanted rows and rebuild Merged_All.xlsx (edit_all.py)")
+    p.add_argument("main_dir")
+    p.add_argument("--incremental", action="store_true")
+    p.set_defaults(func=cmd_clean)
+
+    p = sub.add_parser("features", help="extract features per company-year (build_features.py)")
+    p.add_argument("file")
+    p.add_argument("--out-dir", default="")
+    p.add_argument("--incremental", action="store_true")
+    p.set_defaults(func=cmd_features)
+
+    p = sub.add_parser("zscore", help="Altman Z and the Z_next target (compute_z_and_target.py)")
+    p.add_argument("file")
+    p.add_argument("--incremental", action="store_true")
+    p.add_argument("--panel-features", action="store_true", help="add lags, deltas and rolling stats (panel_features.py)")
+    p.set_defaults(func=cmd_zscore)
+
+    p = sub.add_parser("zreport", help="Altman Z table, risk category and chart for every company (z_reports.py)")
+    p.add_argument("file")
+    p.add_argument("--out-dir", default="", help="where to write the reports (default: next to the file)")
+    p.add_argument("--workers", type=_workers, default=1, help="worker processes (0 = all cores)")
+    p.add_argument("--consolidated", action="store_true", help="one workbook with a sheet per company")
+    p.set_defaults(func=cmd_zreport)
+
+    p = sub.add_parser("train", help="XGBoost Z_next model with evaluation (start_of_Ml/xg_boost_with_eval.py)")
+    p.add_argument("file")
+    p.add_argument("--plots-dir", help="where to save the figures (default: <file dir>/plots)")
+    p.add_argument("--params", help="XGBoost parameters as JSON (e.g. best_params_xgb.json from `tune`)")
+    p.add_argument("--shap-background", type=int, default=100,
+                   help="training rows sampled as SHAP background (0 = XGBoost's path-dependent TreeSHAP, fastest)")
+    p.add_argument("--model-dir", help="model store for the fitted bundle (default: <file dir>/models)")
+    p.set_defaults(func=cmd_train)
+
+    p = sub.add_parser("tune", help="hyperparameter search with company-grouped CV and early stopping (model_search.py)")
+    p.add_argument("file")
+    p.add_argument("--model", choices=["xgb", "rf"], default="xgb")
+    p.add_argument("--trials", type=int, default=30)
+    p.add_argument("--workers", type=_workers, default=0, help="cores to use (0 = all)")
+    p.add_argument("--out-dir", default="", help="where best_params_<model>.json goes (default: next to the file)")
+    p.set_defaults(func=cmd_tune)
+
+    p = sub.add_parser("backtest", help="walk-forward Z_next backtest: train on years ≤ t, predict t+1 (backtest.py)")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="report workbook (default: <file dir>/Backtest.xlsx)")
+    p.add_argument("--params", help="JSON file with XGBRegressor parameters (e.g. from tune)")
+    p.add_argument("--min-train-years", type=int, default=3, help="fiscal years before the first test year")
+    p.add_argument("--step-rounds", type=int, default=50, help="trees added per window when warm-starting")
+    p.add_argument("--chain-years", type=int, default=0,
+                   help="start a fresh warm-start chain every N test years (0 = one chain over all years)")
+    p.add_argument("--refit", action="store_true", help="fit every window from scratch instead of warm-starting")
+    p.add_argument("--workers", type=_workers, default=0, help="cores to use (0 = all)")
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser("score", help="predict Z_next for a features table with a stored model bundle (model_store.py)")
+    p.add_argument("file")
+    p.add_argument("--model-dir", help="model store (default: <file dir>/models)")
+    p.add_argument("--version", type=int, help="bundle version (default: latest)")
+    p.add_argument("-o", "--output", help=".csv, .xlsx or .parquet (default: <file>_predictions.csv)")
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser("serve", help="local HTTP endpoint with the model kept in memory (model_store.py)")
+    p.add_argument("--model-dir", required=True, help="model store written by train (<file dir>/models)")
+    p.add_argument("--version", type=int)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("analyze", help="descriptive stats and correlation of one company (code_mini/analysis.py)")
+    p.add_argument("file")
+    p.add_argument("-o", "--output")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("stats", help="descriptive stats and Pearson/Spearman correlation of every company (panel_stats.py)")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help=".xlsx workbook or .parquet table (default: Panel_Stats.xlsx)")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("all", help="merge → clean → features → zscore in one process")
+    p.add_argument("main_dir")
+    p.add_argument("--workers", type=_workers, default=1, help="worker processes (0 = all cores)")
+    p.add_argument("--incremental", action="store_true")
+    p.add_argument("--panel-features", action="store_true", help="add lags, deltas and rolling stats (panel_features.py)")
+    p.add_argument("--train", action="store_true", help="also train the model on the ML-ready table")
+    p.add_argument("--plots-dir")
+    p.set_defaults(func=cmd_all)
+    return parser
+
+
+def report_dir(args):
+    """The run report goes next to the command's outputs."""
+    if hasattr(args, "main_dir"):
+        return args.main_dir
+    if not hasattr(args, "file"):
+        return args.model_dir
+    if os.path.isdir(getattr(args, "file", "")):
+        return args.file
+    return getattr(args, "out_dir", "") or os.path.dirname(os.path.abspath(args.file))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable()
+    status = args.func(args) or 0
+    profiling.write_report(report_dir(args))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
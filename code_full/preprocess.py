@@ -0,0 +1,110 @@
+# preprocess.py
+"""One preprocessing pipeline for every Z_next trainer, fitted without leakage.
+
+    X, y, groups = split_frame(ml_ready_df)      # groups = Company, taken before it is dropped
+    prep, X_train_t, X_test_t = fit_transform_cached(X_train, X_test, spec)
+
+The pipeline is: drop columns missing in at least `max_missing` of the
+training rows (optional), median imputation, standard scaling. It is always
+fitted on training rows only (the train split, or each CV fold's training
+part) and then applied to the held-out rows.
+
+Fitted pipelines and transformed matrices are cached in
+model_cv.MODEL_CACHE_DIR under a key of the train/test rows and the spec,
+so repeated experiments on the same data skip the imputation and scaling.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import model_cv
+from manifest import frame_digest
+
+DEFAULT_SPEC = {"strategy": "median", "max_missing": None}
+NON_FEATURES = ['Year', 'Company', 'Z_next']
+
+
+# ---------- Frame → X, y, groups ----------
+def split_frame(df, target='Z_next'):
+    """Features, target and CV groups (Company, or one group per row without it) of an ML-ready frame."""
+    groups = df['Company'].to_numpy() if 'Company' in df.columns else np.arange(len(df))
+    X = df.drop(columns=[c for c in NON_FEATURES if c in df.columns])
+    return X.reset_index(drop=True), df[target].reset_index(drop=True), groups
+
+
+# ---------- Pipeline ----------
+class DropSparseColumns(BaseEstimator, TransformerMixin):
+    """Drop the columns whose missing share in the fitted rows is max_missing or more (None: keep all)."""
+
+    def __init__(self, max_missing=None):
+        self.max_missing = max_missing
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        if self.max_missing is None:
+            self.columns_ = list(X.columns)
+        else:
+            self.columns_ = list(X.columns[X.isna().mean() < self.max_missing])
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X):
+        return pd.DataFrame(X)[self.columns_]
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.columns_, dtype=object)
+
+
+def make_preprocess(spec=None):
+    spec = {**DEFAULT_SPEC, **(spec or {})}
+    prep = Pipeline([
+        ('drop_sparse', DropSparseColumns(spec["max_missing"])),
+        ('imputer', SimpleImputer(strategy=spec["strategy"], keep_empty_features=True)),
+        ('scaler', StandardScaler()),
+    ])
+    return prep.set_output(transform="pandas")
+
+
+# ---------- Cached fit / transform ----------
+def _key(X_train, X_test, spec):
+    h = hashlib.sha256()
+    h.update(frame_digest(X_train).encode())
+    h.update(b"-" if X_test is None else frame_digest(X_test).encode())
+    h.update(json.dumps({**DEFAULT_SPEC, **(spec or {})}, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:24]
+
+
+def fit_transform_cached(X_train, X_test=None, spec=None):
+    """(fitted pipeline, transformed X_train, transformed X_test or None), fitted on X_train only."""
+    import joblib
+
+    folder = os.path.join(model_cv.MODEL_CACHE_DIR, "prep-" + _key(X_train, X_test, spec))
+    if model_cv.MODEL_CACHE_ENABLED and os.path.exists(os.path.join(folder, "matrices.npz")):
+        prep = joblib.load(os.path.join(folder, "preprocess.joblib"))
+        columns = list(prep.get_feature_names_out())
+        with np.load(os.path.join(folder, "matrices.npz")) as m:
+            train_t = pd.DataFrame(m["train"], columns=columns, index=X_train.index)
+            test_t = None if X_test is None else pd.DataFrame(m["test"], columns=columns, index=X_test.index)
+        return prep, train_t, test_t
+
+    prep = make_preprocess(spec)
+    train_t = prep.fit_transform(X_train)
+    test_t = None if X_test is None else prep.transform(X_test)
+    if model_cv.MODEL_CACHE_ENABLED:
+        os.makedirs(folder + ".tmp", exist_ok=True)
+        joblib.dump(prep, os.path.join(folder + ".tmp", "preprocess.joblib"))
+        np.savez(os.path.join(folder + ".tmp", "matrices.npz"), train=train_t.to_numpy(),
+                 test=np.empty((0, 0)) if test_t is None else test_t.to_numpy())
+        if os.path.exists(folder):  # written meanwhile by another run
+            shutil.rmtree(folder + ".tmp", ignore_errors=True)
+        else:
+            os.replace(folder + ".tmp", folder)
+    return prep, train_t, test_t
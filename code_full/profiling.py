@@ -0,0 +1,115 @@
+# profiling.py
+"""Per-stage / per-company timing and memory records, written as a run report.
+
+Off by default. Turn it on with RAHAVARD_PROFILE=1 (interactive scripts) or
+`pipeline.py --profile ...`; when off, profile() only yields an empty dict.
+
+    @profiled("zscore")
+    def run_zscore(...): ...
+
+    with profile("features", company) as rec:
+        ...
+        rec["rows"] = len(company_rows)
+
+Every record has stage, company, wall_s, cpu_s and peak_rss_mb (peak resident
+memory of this process so far) plus whatever counts the caller put in it.
+write_report() saves them as run_report.json and run_report.csv.
+"""
+import csv
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("RAHAVARD_PROFILE", "0") not in ("", "0")
+REPORT_NAME = "run_report"
+RECORDS = []
+_ACTIVE = []  # records of the profile() blocks currently open, innermost last
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if it cannot be read)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, "peak_wset", info.rss) / (1 << 20), 1)
+
+
+def record(stage, company=None, **fields):
+    """Add a record measured elsewhere (e.g. inside a worker process)."""
+    if ENABLED:
+        RECORDS.append({"stage": stage, "company": company, **fields})
+
+
+@contextmanager
+def profile(stage, company=None):
+    if not ENABLED:
+        yield {}
+        return
+    rec = {"stage": stage, "company": company}
+    _ACTIVE.append(rec)
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield rec
+    finally:
+        _ACTIVE.pop()
+        rec["wall_s"] = round(time.perf_counter() - wall0, 4)
+        rec["cpu_s"] = round(time.process_time() - cpu0, 4)
+        rec["peak_rss_mb"] = peak_rss_mb()
+        RECORDS.append(rec)
+
+
+def current():
+    """Record of the innermost open profile() block, for adding counts ({} when off)."""
+    return _ACTIVE[-1] if _ACTIVE else {}
+
+
+def profiled(stage):
+    """Decorator: one record for every call of a whole stage function."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with profile(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def write_report(directory):
+    """Write run_report.json / run_report.csv into directory; returns the JSON path (None when off)."""
+    if not ENABLED or not RECORDS:
+        return None
+    json_path = os.path.join(directory, REPORT_NAME + ".json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "records": RECORDS},
+                  f, ensure_ascii=False, indent=1)
+
+    columns = []
+    for rec in RECORDS:
+        columns.extend(k for k in rec if k not in columns)
+    with open(os.path.join(directory, REPORT_NAME + ".csv"), "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(RECORDS)
+    print(f"⏱️ Run report saved: {json_path}")
+    return json_path
@@ -0,0 +1,159 @@
+# tidy_store.py
+"""Long-format ("tidy") copy of the merged statements.
+
+One row per (company, statement, row label, period) with a typed numeric value,
+written as a single Parquet file next to Merged_All.xlsx. Later stages filter
+and pivot it directly instead of re-parsing one wide Excel sheet per company.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from labels import normalize_text
+from numeric import to_number_frame
+
+TIDY_FILE = "Merged_All_tidy.parquet"
+TIDY_COLUMNS = ["company", "statement", "row", "label", "normalized_label", "period", "year", "value"]
+
+_SEPARATOR = re.compile(r'^--- (.*) ---$')
+
+
+def period_year(col):
+    """Fiscal year of a period header such as '1399/12/30' (None if there is none)."""
+    s = normalize_text(str(col))
+    m = re.match(r'(\d{3,4})', s)
+    return int(m.group(1)) if m else None
+
+
+def tidy_company(company_name, combined_data):
+    """Melt one merged company frame (separator rows + label column + period columns)."""
+    label_col = combined_data.columns[0]
+    labels = combined_data[label_col]
+    text = labels.astype(object).where(labels.notna(), '').astype(str)
+    section = text.str.extract(_SEPARATOR, expand=False)
+    is_sep = section.notna()
+    statement = section.ffill()
+
+    body = combined_data[~is_sep & labels.notna()]
+    periods = [str(c) for c in combined_data.columns[1:]]
+    values = to_number_frame(body.iloc[:, 1:]).to_numpy(dtype='float64')
+    n, m = values.shape
+
+    return pd.DataFrame({
+        "company": company_name,
+        "statement": np.repeat(statement[body.index].to_numpy(dtype=object), m),
+        "row": np.repeat(np.arange(len(combined_data))[(~is_sep & labels.notna()).to_numpy()], m),
+        "label": np.repeat(body[label_col].astype(str).to_numpy(dtype=object), m),
+        "normalized_label": np.repeat(np.array([normalize_text(x) for x in body[label_col]], dtype=object), m),
+        "period": np.tile(np.array(periods, dtype=object), n),
+        "year": pd.array(np.tile(np.array([period_year(p) for p in periods], dtype=object), n), dtype="Int16"),
+        "value": values.ravel(),
+    }, columns=TIDY_COLUMNS)
+
+
+class TidyWriter:
+    """Append per-company tidy frames to one Parquet file, one row group each.
+
+    Only the frame being added is held in memory; the file is moved into
+    place on close() (or dropped by discard()). As a context manager it
+    closes on success and discards on error.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._writer = None
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("⚠️ Tidy store skipped (install pyarrow)")
+            self.path = None
+            return
+        self._pa, self._pq = pa, pq
+        self._schema = pa.schema([
+            ("company", pa.string()), ("statement", pa.string()), ("row", pa.int64()),
+            ("label", pa.string()), ("normalized_label", pa.string()), ("period", pa.string()),
+            ("year", pa.int16()), ("value", pa.float64()),
+        ])
+
+    def add(self, frame):
+        if self.path is None or frame.empty:
+            return
+        table = self._pa.Table.from_pandas(frame[TIDY_COLUMNS], schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path + ".tmp", self._schema)
+        self._writer.write_table(table)
+        self.rows += len(frame)
+
+    def close(self):
+        """Finish the file; returns its path (None if nothing was written)."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        os.replace(self.path + ".tmp", self.path)
+        return self.path
+
+    def discard(self):
+        """Drop what was written so far; the previous file (if any) stays."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_tidy(frames, path):
+    """Write per-company tidy frames as one Parquet file."""
+    writer = TidyWriter(path)
+    for frame in frames:
+        writer.add(frame)
+    return writer.close()
+
+
+def read_tidy(path, companies=None, statements=None, labels=None):
+    """Load the tidy store, optionally filtered (pushed down to the Parquet reader)."""
+    filters = []
+    if companies is not None:
+        filters.append(("company", "in", list(companies)))
+    if statements is not None:
+        filters.append(("statement", "in", list(statements)))
+    if labels is not None:
+        filters.append(("normalized_label", "in", list(labels)))
+    tidy = pd.read_parquet(path, filters=filters or None)
+    for col in ("company", "statement", "period"):
+        tidy[col] = tidy[col].astype(object)
+    return tidy
+
+
+def companies_in(tidy):
+    """Companies in the order they were written."""
+    return list(pd.unique(tidy["company"]))
+
+
+def pivot_company(tidy, company):
+    """Wide 'row label × period' frame of one company, rows and periods in source order.
+
+    Rows are labelled by normalized label; labels that only differed by
+    ZWNJ or whitespace keep their first row (as panel_stats.load_panel does).
+    """
+    sub = tidy[tidy["company"] == company]
+    wide = sub.pivot(index="row", columns="period", values="value")
+    wide = wide.reindex(columns=pd.unique(sub["period"]))
+    labels = sub.drop_duplicates("row").set_index("row")["normalized_label"]
+    wide.index = pd.Index(labels.reindex(wide.index).to_numpy(), name="label")
+    wide = wide[~wide.index.duplicated(keep="first")]
+    wide.columns.name = None
+    return wide
@@ -0,0 +1,72 @@
+# xlsx_reader.py
+"""Selective .xlsx reader: only the rows whose label a stage actually needs.
+
+Worksheets are streamed row by row with openpyxl's read-only mode; rows whose
+first-column label cannot match any requested phrase (see labels.LabelSelector)
+are dropped as they are read, and a sheet is abandoned as soon as every phrase
+has been found exactly. The kept rows go through pandas' own Excel parsing
+path, so the frame equals pd.read_excel(...) restricted to those rows.
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from labels import LabelSelector
+
+
+def _convert_cell(cell):
+    # same conversion as pandas' openpyxl reader
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        return val if val == cell.value else float(cell.value)
+    return cell.value
+
+
+def _convert_row(row):
+    values = [_convert_cell(cell) for cell in row]
+    while values and values[-1] == "":
+        values.pop()
+    return values
+
+
+def _read_sheet(ws, phrases):
+    ws.reset_dimensions()
+    rows = iter(ws.rows)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    data = [_convert_row(header)]
+    width = len(data[0])
+    selector = LabelSelector(phrases)
+    for row in rows:
+        values = _convert_row(row)
+        width = max(width, len(values))
+        if values and selector.wants(values[0]):
+            data.append(values)
+            if selector.complete:
+                break
+    data = [values + [""] * (width - len(values)) for values in data]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def read_labeled_rows(path, phrases, sheet_name=0):
+    """Header row plus the rows whose label may match one of `phrases`.
+
+    sheet_name is a name, a position, or None for a dict of every sheet
+    (like pd.read_excel). Columns are the header's plus any wider rows seen
+    before the sheet was abandoned.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_name is None:
+            return {name: _read_sheet(wb[name], phrases) for name in wb.sheetnames}
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        return _read_sheet(ws, phrases)
+    finally:
+        wb.close()
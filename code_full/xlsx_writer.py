@@ -0,0 +1,138 @@
+# xlsx_writer.py
+"""Streaming .xlsx writer: one sheet per company, appended as soon as it is ready.
+
+Uses openpyxl's write-only mode, which flushes every row to disk instead of
+building the whole workbook in memory, so peak memory is bounded by the frame
+being written rather than by all companies at once. Sheets look like
+DataFrame.to_excel(index=False): a bold, bordered header row, then the values.
+
+The report colors (color_frame) are native Excel conditional formats added
+while the report is written, one rule per color and sheet instead of a fill
+on every cell.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+_THIN = Side(style="thin")
+_HEADER_FONT = Font(bold=True)
+_HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_HEADER_ALIGN = Alignment(horizontal="center", vertical="top")
+
+# (condition on {cell}, fill color); only numeric cells are colored
+SIGN_RULES = [
+    ("{cell}<0", "FFC7CE"),  # red
+    ("{cell}>0", "C6EFCE"),  # green
+]
+CORRELATION_RULES = [
+    ("{cell}>=0.7", "B3C6FF"),  # strong positive: blue
+    ("{cell}<=-0.7", "FF9999"),  # strong negative: red
+    ("AND({cell}>-0.3,{cell}<0.3)", "F2F2F2"),  # weak: light grey
+]
+
+
+def _cell_value(v):
+    if v is None or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, float) and v != v:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    if isinstance(v, np.generic):
+        v = v.item()
+        return None if isinstance(v, float) and v != v else v
+    if isinstance(v, (str, int, float, bool, datetime.date, datetime.datetime)):
+        return v
+    return str(v)
+
+
+class StreamingWorkbook:
+    """Context manager: `with StreamingWorkbook(path) as wb: wb.add_sheet(name, df)`.
+
+    Saved on leaving the block, discarded (temp files removed) on an error.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sheet_names = []
+        self._wb = Workbook(write_only=True)
+
+    def add_sheet(self, sheet_name, df):
+        ws = self._wb.create_sheet(title=sheet_name)
+        header = []
+        for name in df.columns:
+            cell = WriteOnlyCell(ws, value=_cell_value(name))
+            cell.font = _HEADER_FONT
+            cell.border = _HEADER_BORDER
+            cell.alignment = _HEADER_ALIGN
+            header.append(cell)
+        ws.append(header)
+        for row in df.itertuples(index=False, name=None):
+            ws.append([_cell_value(v) for v in row])
+        self.sheet_names.append(sheet_name)
+
+    def close(self):
+        if self._wb is None:
+            return
+        if not self.sheet_names:
+            self._wb.create_sheet(title="Sheet1")
+        self._wb.save(self.path)
+        self._wb = None
+
+    def discard(self):
+        """Drop the workbook unsaved and remove the temp files of its sheets."""
+        if self._wb is None:
+            return
+        for ws in self._wb.worksheets:
+            ws.close()  # finish the sheet's temp file so it can be removed
+            ws._writer.cleanup()
+        self._wb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # a failed run must not leave a half-written workbook behind
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+# ---------- Conditional formatting ----------
+def add_color_rules(writer, sheet_name, first_row, first_col, last_row, last_col, rules):
+    """Color a cell range (0-based, inclusive) of a pd.ExcelWriter sheet by `rules`.
+
+    Works with both the xlsxwriter and the openpyxl engine; nothing is
+    evaluated in Python, Excel applies the rules when the file is opened.
+    """
+    if last_row < first_row or last_col < first_col:
+        return
+    top_left = f"{get_column_letter(first_col + 1)}{first_row + 1}"
+    ws = writer.sheets[sheet_name]
+    for condition, color in rules:
+        formula = f"AND(ISNUMBER({top_left}),{condition.format(cell=top_left)})"
+        if writer.engine == "xlsxwriter":
+            ws.conditional_format(first_row, first_col, last_row, last_col, {
+                "type": "formula", "criteria": "=" + formula,
+                "format": writer.book.add_format({"bg_color": "#" + color}),
+            })
+        else:
+            cell_range = f"{top_left}:{get_column_letter(last_col + 1)}{last_row + 1}"
+            fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+            ws.conditional_formatting.add(cell_range, FormulaRule(formula=[formula], fill=fill))
+
+
+def color_frame(writer, sheet_name, df, rules, skip_cols=0):
+    """add_color_rules() over the values of a frame written with df.to_excel(writer, sheet_name)
+    (index and header included), leaving out its first `skip_cols` value columns."""
+    first_row = df.columns.nlevels + (1 if df.columns.nlevels > 1 else 0)
+    first_col = df.index.nlevels + skip_cols
+    add_color_rules(writer, sheet_name, first_row, first_col,
+                    first_row + len(df) - 1, df.index.nlevels + df.shape[1] - 1, rules)
@@ -0,0 +1,137 @@
+# z_reports.py
+"""Altman Z report workbooks: Z table, risk category and trend chart.
+
+code_mini/z_score.py makes one report from one company's merged file. Here
+the reports of all companies come from the features table in one pass: the
+ratios, Z and risk zone are computed for every company-year at once, then
+the table is split by company and the workbooks are written by a pool of
+worker processes (one _AltmanZ_Report.xlsx per company), or into one
+consolidated workbook with a sheet per company.
+"""
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from altman import altman_z, compute_ratios, risk_zone
+from excel_cache import read_excel_cached
+from profiling import current, profiled
+
+CONSOLIDATED_FILE = "Altman_Z_Reports.xlsx"
+_BAD_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+# ---------- Z table ----------
+def z_table(base):
+    """(table, missing years) from base numbers indexed by year.
+
+    table has Year, Altman Z and Risk Category for the years whose X1..X5
+    could all be computed, sorted by year.
+    """
+    x = compute_ratios(base)
+    z = altman_z(x)
+    valid = x.notna().all(axis=1)
+    table = pd.DataFrame({"Year": z.index[valid], "Altman Z": z[valid].to_numpy()}).sort_values("Year")
+    table["Risk Category"] = risk_zone(table["Altman Z"]).to_numpy()
+    return table, list(z.index[~valid])
+
+
+def company_tables(features):
+    """{company: (table, missing years)} for a features table (Company, Year, base columns).
+
+    Ratios, Z and zones are computed once over the whole table.
+    """
+    x = compute_ratios(features)
+    z = altman_z(x)
+    valid = x.notna().all(axis=1)
+    rows = pd.DataFrame({"Company": features["Company"], "Year": features["Year"], "Altman Z": z,
+                         "Risk Category": risk_zone(z).to_numpy(), "valid": valid})
+
+    tables = {}
+    for company, sub in rows.groupby("Company", sort=False):
+        table = sub.loc[sub["valid"], ["Year", "Altman Z", "Risk Category"]]
+        tables[company] = (table.sort_values("Year").reset_index(drop=True), list(sub.loc[~sub["valid"], "Year"]))
+    return tables
+
+
+# ---------- Writing ----------
+def sheet_title(name):
+    """A valid, at most 31-character Excel sheet name."""
+    return _BAD_SHEET_CHARS.sub("_", str(name))[:31] or "Sheet"
+
+
+def write_z_sheet(writer, sheet_name, z_df, title="Altman Z-Score Trend Over Years"):
+    """Z table plus a line chart next to it, on one sheet of an xlsxwriter ExcelWriter."""
+    z_df.to_excel(writer, sheet_name=sheet_name, index=False)
+    worksheet = writer.sheets[sheet_name]
+
+    # Create a chart
+    chart = writer.book.add_chart({"type": "line"})
+    chart.add_series({
+        "name": "Altman Z-Score",
+        "categories": [sheet_name, 1, 0, len(z_df), 0],
+        "values": [sheet_name, 1, 1, len(z_df), 1],
+        "data_labels": {"value": True},
+        "line": {"color": "#008080"}
+    })
+    chart.set_title({"name": title})
+    chart.set_x_axis({"name": "Year"})
+    chart.set_y_axis({"name": "Z-Score"})
+    chart.set_style(10)
+
+    # Insert chart next to the table
+    worksheet.insert_chart("E2", chart)
+
+
+def write_company_report(out_dir, company, z_df):
+    """<company>_AltmanZ_Report.xlsx in out_dir (overwritten); returns (company, path, seconds)."""
+    start = time.perf_counter()
+    output_file = os.path.join(out_dir, f"{company}_AltmanZ_Report.xlsx")
+    with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
+        write_z_sheet(writer, "Z_Score_Table", z_df)
+    return company, output_file, time.perf_counter() - start
+
+
+# ---------- Batch ----------
+@profiled("zreport")
+def run_z_reports(features_file, out_dir="", workers=1, consolidated=False):
+    """Write the Altman Z reports of every company in the features table; returns the written files."""
+    features = read_excel_cached(features_file)
+    out_dir = out_dir or os.path.dirname(os.path.abspath(features_file))
+    os.makedirs(out_dir, exist_ok=True)
+
+    tables = company_tables(features)
+    reports = {company: z_df for company, (z_df, _) in tables.items() if not z_df.empty}
+    for company, (z_df, missing_years) in tables.items():
+        if z_df.empty:
+            print(f"❌ {company}: no valid Z-Scores could be calculated.")
+        elif missing_years:
+            print(f"⚠️ {company}: Z-Score missing for years {missing_years}")
+    current().update(companies=len(reports), rows=len(features))
+
+    written = []
+    if consolidated:
+        output_file = os.path.join(out_dir, CONSOLIDATED_FILE)
+        with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
+            used = set()
+            for company, z_df in reports.items():
+                name = sheet_title(company)
+                while name.lower() in used:
+                    name = sheet_title(f"{name[:27]}_{len(used)}")
+                used.add(name.lower())
+                write_z_sheet(writer, name, z_df, title=f"{company} — Altman Z-Score Trend")
+        written.append(output_file)
+        print(f"💾 {len(reports)} company sheets saved in: {output_file}")
+    else:
+        jobs = list(reports.items())
+        if workers <= 1 or len(jobs) <= 1:
+            results = [write_company_report(out_dir, company, z_df) for company, z_df in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(write_company_report, [out_dir] * len(jobs),
+                                            *zip(*jobs), chunksize=max(1, len(jobs) // (4 * workers))))
+        written = [path for _, path, _ in results]
+        print(f"💾 {len(written)} reports saved in: {out_dir}")
+    return written
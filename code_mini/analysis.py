@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
 from openpyxl.utils.dataframe import dataframe_to_rows
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_rows_cached
+from labels import label_names
+from numeric import to_number_frame
+from xlsx_writer import CORRELATION_RULES, SIGN_RULES, color_frame
 
 # -----------------------------
 # تنظیمات اولیه
@@ -36,76 +42,57 @@ selected_vars = [
     "سود خالص به فروش"
 ]
 
-# -----------------------------
-# خواندن داده
-# -----------------------------
-df = pd.read_excel(input_file)
 
-# فقط ردیف‌های مورد نظر را نگه می‌داریم
-df = df[df.iloc[:, 0].isin(selected_vars)].copy()
+def run_analysis(input_file, output_file):
+    """Descriptive statistics and correlation of selected_vars for one merged company file."""
+    # -----------------------------
+    # خواندن داده
+    # -----------------------------
+    # فقط ردیف‌هایی که ممکن است یکی از selected_vars باشند خوانده می‌شوند (خواندن جریانی با توقف زودهنگام)
+    df = read_rows_cached(input_file, selected_vars)
 
-# ستون اول (نام متغیر) را اندیس قرار می‌دهیم
-df.set_index(df.columns[0], inplace=True)
+    # فقط ردیف‌های مورد نظر را نگه می‌داریم (تطابق دقیق، نام‌های هم‌معنا و غلط‌های املایی؛ بدون تطابق جزئی)
+    names = label_names(df.iloc[:, 0].tolist(), selected_vars)
+    df = df[df.iloc[:, 0].isin(list(names))].copy()
+    df.iloc[:, 0] = df.iloc[:, 0].map(names)
 
-# تبدیل همه داده‌ها به عدد (در صورت وجود کاراکتر غیرعددی)
-df = df.applymap(lambda x: pd.to_numeric(str(x).replace(',', ''), errors='coerce'))
+    # ستون اول (نام متغیر) را اندیس قرار می‌دهیم
+    df.set_index(df.columns[0], inplace=True)
 
-# -----------------------------
-# 1️⃣ تحلیل توصیفی
-# -----------------------------
-desc_stats = df.T.describe().T  # توصیف آماری برای هر متغیر
-desc_stats["Skewness"] = df.T.skew().values
-desc_stats["Kurtosis"] = df.T.kurtosis().values
+    # تبدیل همه داده‌ها به عدد (ارقام فارسی، جداکننده‌ها و اعداد منفی داخل پرانتز) به‌صورت برداری
+    df = to_number_frame(df)
 
-# نام ستون‌ها به انگلیسی برای خروجی
-desc_stats.columns = [
-    "Count", "Mean", "Std", "Min", "25%", "50%", "75%", "Max", "Skewness", "Kurtosis"
-]
+    # -----------------------------
+    # 1️⃣ تحلیل توصیفی
+    # -----------------------------
+    desc_stats = df.T.describe().T  # توصیف آماری برای هر متغیر
+    desc_stats["Skewness"] = df.T.skew().values
+    desc_stats["Kurtosis"] = df.T.kurtosis().values
 
-# -----------------------------
-# 2️⃣ ماتریس همبستگی
-# -----------------------------
-corr_matrix = df.T.corr(method='pearson')
-
-# -----------------------------
-# ذخیره در فایل اکسل (دو شیت جدا)
-# -----------------------------
-with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-    desc_stats.to_excel(writer, sheet_name="Descriptive_Analysis")
-    corr_matrix.to_excel(writer, sheet_name="Correlation_Matrix")
+    # نام ستون‌ها به انگلیسی برای خروجی
+    desc_stats.columns = [
+        "Count", "Mean", "Std", "Min", "25%", "50%", "75%", "Max", "Skewness", "Kurtosis"
+    ]
 
-# -----------------------------
-# رنگ‌بندی در اکسل برای دید بهتر
-# -----------------------------
-wb = load_workbook(output_file)
+    # -----------------------------
+    # 2️⃣ ماتریس همبستگی
+    # -----------------------------
+    corr_matrix = df.T.corr(method='pearson')
 
-# رنگ‌بندی برای شیت تحلیل توصیفی (سبز: بالا، قرمز: پایین)
-ws1 = wb["Descriptive_Analysis"]
-for row in ws1.iter_rows(min_row=2, min_col=3):
-    for cell in row:
-        try:
-            val = float(cell.value)
-            if val < 0:
-                cell.fill = PatternFill(start_color="FFC7CE", fill_type="solid")  # قرمز
-            elif val > 0:
-                cell.fill = PatternFill(start_color="C6EFCE", fill_type="solid")  # سبز
-        except:
-            pass
+    # -----------------------------
+    # ذخیره در فایل اکسل (دو شیت جدا)
+    # -----------------------------
+    # رنگ‌بندی به‌صورت قالب‌بندی شرطی اکسل در همان نوشتن (بدون باز کردن دوباره فایل و حلقه روی سلول‌ها)
+    with pd.ExcelWriter(output_file) as writer:
+        desc_stats.to_excel(writer, sheet_name="Descriptive_Analysis")
+        corr_matrix.to_excel(writer, sheet_name="Correlation_Matrix")
+        # تحلیل توصیفی (سبز: مثبت، قرمز: منفی) — ستون Count رنگ نمی‌گیرد
+        color_frame(writer, "Descriptive_Analysis", desc_stats, SIGN_RULES, skip_cols=1)
+        # همبستگی (آبی: ≥ 0.7، قرمز: ≤ -0.7، خاکستری: ضعیف)
+        color_frame(writer, "Correlation_Matrix", corr_matrix, CORRELATION_RULES)
+    print("✅ تحلیل توصیفی و همبستگی با موفقیت ذخیره شد →", output_file)
+    return output_file
 
-# رنگ‌بندی برای شیت همبستگی (قرمز منفی، آبی مثبت)
-ws2 = wb["Correlation_Matrix"]
-for row in ws2.iter_rows(min_row=2, min_col=2):
-    for cell in row:
-        try:
-            val = float(cell.value)
-            if val >= 0.7:
-                cell.fill = PatternFill(start_color="B3C6FF", fill_type="solid")  # آبی پررنگ
-            elif val <= -0.7:
-                cell.fill = PatternFill(start_color="FF9999", fill_type="solid")  # قرمز پررنگ
-            elif -0.3 < val < 0.3:
-                cell.fill = PatternFill(start_color="F2F2F2", fill_type="solid")  # خاکستری روشن
-        except:
-            pass
 
-wb.save(output_file)
-print("✅ تحلیل توصیفی و همبستگی با موفقیت ذخیره شد →", output_file)
+if __name__ == "__main__":
+    run_analysis(input_file, output_file)
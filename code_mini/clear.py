@@ -1,12 +1,17 @@
 import os
 import pandas as pd
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from labels import RowFilter
 
 # === USER INPUT ===
 main_path = input("Please enter the main directory path: ").strip()
 company_name = "دعبید"  # change this to your test company name
 
 # === SUBFOLDERS ===
-folders = ["ترازنامه", "سود و زیان", "نسبت های مالی"]
+folders = ["ترازنامه", "سود و زیان", "نسبت های مالی", "گردش وجوه نقد"]
 
 # === ROWS TO REMOVE (exact or partial match) ===
 rows_to_remove = [
@@ -17,6 +22,7 @@ rows_to_remove = [
     "اقلام غیر مترقبه",
     "اثرات انباشته تغییر در اصول و روشهای"
 ]
+row_filter = RowFilter(rows_to_remove)  # compiled once, one scan per sheet
 
 # === FILE PATHS ===
 output_single = os.path.join(main_path, f"{company_name}_Merged.xlsx")
@@ -24,21 +30,18 @@ output_all = os.path.join(main_path, "Merged_All.xlsx")
 
 # === FUNCTION: CLEAN DATAFRAME ===
 def clean_dataframe(df):
-    if df.empty:
-        return df
-    # Find which column contains row labels (usually the first one)
-    first_col = df.columns[0]
-    # Drop rows where the first column contains any of the unwanted phrases
-    for phrase in rows_to_remove:
-        df = df[~df[first_col].astype(str).str.contains(phrase, na=False)]
-    df.reset_index(drop=True, inplace=True)
-    return df
+    """Drop rows whose label (first column) contains an unwanted phrase.
+
+    Returns (cleaned df, {phrase: rows removed}); the phrases are matched
+    literally in a single pass over the label column.
+    """
+    return row_filter.apply(df)
 
 # === IF MERGED FILE ALREADY EXISTS, LOAD AND CLEAN ===
 if os.path.exists(output_single):
     print(f"⚙️ Existing merged file found for {company_name}. Applying cleaning only...")
-    combined_data = pd.read_excel(output_single)
-    combined_data = clean_dataframe(combined_data)
+    combined_data = read_excel_cached(output_single)
+    combined_data, removed = clean_dataframe(combined_data)
 else:
     print(f"🧩 Merging data for {company_name} ...")
     data_parts = {}
@@ -47,7 +50,7 @@ else:
         if not os.path.exists(file_path):
             print(f"❌ File not found: {file_path}")
             continue
-        df = pd.read_excel(file_path)
+        df = read_excel_cached(file_path)
         data_parts[folder] = df
 
     combined_data = pd.DataFrame()
@@ -55,7 +58,11 @@ else:
         separator = pd.DataFrame([[f"--- {section_name} ---"]], columns=[df.columns[0]])
         combined_data = pd.concat([combined_data, separator, df], ignore_index=True)
 
-    combined_data = clean_dataframe(combined_data)
+    combined_data, removed = clean_dataframe(combined_data)
+
+for phrase, n in removed.items():
+    if n:
+        print(f"🧹 Removed {n} row(s) containing: {phrase}")
 
 # === SAVE UPDATED / CLEANED FILES ===
 combined_data.to_excel(output_single, index=False)
@@ -1,12 +1,16 @@
 import os
 import pandas as pd
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
 
 # === USER INPUT ===
 main_path = input("Please enter the main directory path: ").strip()
 company_name = "دعبید"  # change this to your test company name
 
 # === SUBFOLDERS ===
-folders = ["ترازنامه", "سود و زیان", "نسبت های مالی"]
+folders = ["ترازنامه", "سود و زیان", "نسبت های مالی", "گردش وجوه نقد"]
 
 # === READ AND MERGE ===
 data_parts = {}
@@ -18,7 +22,7 @@ for folder in folders:
         print(f"❌ File not found: {file_path}")
         continue
     
-    df = pd.read_excel(file_path)
+    df = read_excel_cached(file_path)
     data_parts[folder] = df
 
 # === COMBINE DATA ===
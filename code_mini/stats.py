@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
 from openpyxl.utils.dataframe import dataframe_to_rows
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from labels import label_names
+from numeric import to_number_frame
+from xlsx_writer import CORRELATION_RULES, SIGN_RULES, color_frame
 
 # -----------------------------
 # تنظیمات اولیه
@@ -39,16 +45,18 @@ selected_vars = [
 # -----------------------------
 # خواندن داده
 # -----------------------------
-df = pd.read_excel(input_file)
+df = read_excel_cached(input_file)
 
-# فقط ردیف‌های مورد نظر را نگه می‌داریم
-df = df[df.iloc[:, 0].isin(selected_vars)].copy()
+# فقط ردیف‌های مورد نظر را نگه می‌داریم (تطابق دقیق، نام‌های هم‌معنا و غلط‌های املایی؛ بدون تطابق جزئی)
+names = label_names(df.iloc[:, 0].tolist(), selected_vars)
+df = df[df.iloc[:, 0].isin(list(names))].copy()
+df.iloc[:, 0] = df.iloc[:, 0].map(names)
 
 # ستون اول (نام متغیر) را اندیس قرار می‌دهیم
 df.set_index(df.columns[0], inplace=True)
 
-# تبدیل همه داده‌ها به عدد (در صورت وجود کاراکتر غیرعددی)
-df = df.applymap(lambda x: pd.to_numeric(str(x).replace(',', ''), errors='coerce'))
+# تبدیل همه داده‌ها به عدد (ارقام فارسی، جداکننده‌ها و اعداد منفی داخل پرانتز) به‌صورت برداری
+df = to_number_frame(df)
 
 # -----------------------------
 # 1️⃣ تحلیل توصیفی
@@ -70,42 +78,12 @@ corr_matrix = df.T.corr(method='pearson')
 # -----------------------------
 # ذخیره در فایل اکسل (دو شیت جدا)
 # -----------------------------
-with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+# رنگ‌بندی به‌صورت قالب‌بندی شرطی اکسل در همان نوشتن (بدون باز کردن دوباره فایل و حلقه روی سلول‌ها)
+with pd.ExcelWriter(output_file) as writer:
     desc_stats.to_excel(writer, sheet_name="Descriptive_Analysis")
     corr_matrix.to_excel(writer, sheet_name="Correlation_Matrix")
-
-# -----------------------------
-# رنگ‌بندی در اکسل برای دید بهتر
-# -----------------------------
-wb = load_workbook(output_file)
-
-# رنگ‌بندی برای شیت تحلیل توصیفی (سبز: بالا، قرمز: پایین)
-ws1 = wb["Descriptive_Analysis"]
-for row in ws1.iter_rows(min_row=2, min_col=3):
-    for cell in row:
-        try:
-            val = float(cell.value)
-            if val < 0:
-                cell.fill = PatternFill(start_color="FFC7CE", fill_type="solid")  # قرمز
-            elif val > 0:
-                cell.fill = PatternFill(start_color="C6EFCE", fill_type="solid")  # سبز
-        except:
-            pass
-
-# رنگ‌بندی برای شیت همبستگی (قرمز منفی، آبی مثبت)
-ws2 = wb["Correlation_Matrix"]
-for row in ws2.iter_rows(min_row=2, min_col=2):
-    for cell in row:
-        try:
-            val = float(cell.value)
-            if val >= 0.7:
-                cell.fill = PatternFill(start_color="B3C6FF", fill_type="solid")  # آبی پررنگ
-            elif val <= -0.7:
-                cell.fill = PatternFill(start_color="FF9999", fill_type="solid")  # قرمز پررنگ
-            elif -0.3 < val < 0.3:
-                cell.fill = PatternFill(start_color="F2F2F2", fill_type="solid")  # خاکستری روشن
-        except:
-            pass
-
-wb.save(output_file)
+    # تحلیل توصیفی (سبز: مثبت، قرمز: منفی) — ستون Count رنگ نمی‌گیرد
+    color_frame(writer, "Descriptive_Analysis", desc_stats, SIGN_RULES, skip_cols=1)
+    # همبستگی (آبی: ≥ 0.7، قرمز: ≤ -0.7، خاکستری: ضعیف)
+    color_frame(writer, "Correlation_Matrix", corr_matrix, CORRELATION_RULES)
 print("✅ تحلیل توصیفی و همبستگی با موفقیت ذخیره شد →", output_file)
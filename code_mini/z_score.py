@@ -1,14 +1,29 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from labels import resolve_rows
+from z_reports import run_z_reports, write_z_sheet, z_table
 
 # Step 1: Input
 file_name = input("Please enter the main directory path: ").strip()
 
+# Batch mode: every company of the features table (Merged_All_Cleaned_Features.xlsx) at once
+if input("Reports for all companies of a features table? (y/N): ").strip().lower() == "y":
+    workers = int(input("Worker processes (0 = all cores) [0]: ").strip() or 0) or (os.cpu_count() or 1)
+    consolidated = input("One workbook with a sheet per company? (y/N): ").strip().lower() == "y"
+    if not os.path.exists(file_name):
+        print("❌ File not found. Make sure it is in the same folder.")
+        exit()
+    run_z_reports(file_name, workers=workers, consolidated=consolidated)
+    exit()
+
 
 # Step 2: Load File
 try:
-    df = pd.read_excel(file_name)
+    df = read_excel_cached(file_name)
     print(f"✅ File '{file_name}' loaded successfully.")
 except FileNotFoundError:
     print("❌ File not found. Make sure it is in the same folder.")
@@ -36,50 +51,26 @@ req_rows = {
     "Equity": "جمع حقوق صاحبان سهام"
 }
 
-# Step 6: Compute Altman Z per year
-z_scores = {}
-missing_years = []  # to store years that couldn't be calculated
-
-for year in years:
-    try:
-        X1 = (df_rows.loc[req_rows["CurrentAssets"], year] - df_rows.loc[req_rows["CurrentLiabilities"], year]) / df_rows.loc[req_rows["TotalAssets"], year]
-        X2 = df_rows.loc[req_rows["RetainedEarnings"], year] / df_rows.loc[req_rows["TotalAssets"], year]
-        X3 = df_rows.loc[req_rows["EBIT"], year] / df_rows.loc[req_rows["TotalAssets"], year]
-        X4 = df_rows.loc[req_rows["Equity"], year] / df_rows.loc[req_rows["TotalLiabilities"], year]
-        X5 = df_rows.loc[req_rows["Sales"], year] / df_rows.loc[req_rows["TotalAssets"], year]
-
-        if any(pd.isna([X1, X2, X3, X4, X5])):
-            missing_years.append(year)
-            continue
-
-        z = 1.2*X1 + 1.4*X2 + 3.3*X3 + 0.6*X4 + 1.0*X5
-        z_scores[year] = z
+# Step 6: Compute Altman Z for all years at once
+# one row per year with the base numbers (first row carrying each label)
+# labels are resolved like build_features.py: exact, spelling variants, synonyms, fuzzy
+row_map = resolve_rows(df_rows.index, req_rows)
+base = pd.DataFrame(index=years)
+for key, label in row_map.items():
+    if label is not None:
+        row = df_rows.loc[[label], years].iloc[0]
+        base[key] = pd.to_numeric(row, errors='coerce').to_numpy()
+    else:
+        base[key] = float('nan')
 
-    except KeyError:
-        missing_years.append(year)
-    except Exception as e:
-        print(f"⚠️ Unexpected error for year {year}: {e}")
-        missing_years.append(year)
+z_df, missing_years = z_table(base)  # years that couldn't be calculated are listed
 
-# Step 7: Create Z DataFrame
-if not z_scores:
+# Step 7: Check the Z table
+if z_df.empty:
     print("❌ No valid Z-Scores could be calculated. Please check your data.")
     exit()
 
-z_df = pd.DataFrame(list(z_scores.items()), columns=["Year", "Altman Z"]).sort_values("Year")
-
-# Step 8: Risk Category
-def classify_z(z):
-    if z > 2.99:
-        return "Safe Zone"
-    elif z >= 1.81:
-        return "Grey Zone"
-    else:
-        return "Distress Zone"
-
-z_df["Risk Category"] = z_df["Altman Z"].apply(classify_z)
-
-# Step 9: Save with chart in Excel
+# Step 8: Output name (never overwrite an earlier report)
 base_name = os.path.splitext(file_name)[0]
 output_file = f"{base_name}_AltmanZ_Report.xlsx"
 version = 1
@@ -87,29 +78,9 @@ while os.path.exists(output_file):
     version += 1
     output_file = f"{base_name}_AltmanZ_Report_v{version}.xlsx"
 
+# Step 9: Save Z table, risk category and chart in Excel
 with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
-    workbook = writer.book
-
-    # Write Z table
-    z_df.to_excel(writer, sheet_name="Z_Score_Table", index=False)
-    worksheet = writer.sheets["Z_Score_Table"]
-
-    # Create a chart
-    chart = workbook.add_chart({"type": "line"})
-    chart.add_series({
-        "name": "Altman Z-Score",
-        "categories": f"=Z_Score_Table!$A$2:$A${len(z_df)+1}",
-        "values": f"=Z_Score_Table!$B$2:$B${len(z_df)+1}",
-        "data_labels": {"value": True},
-        "line": {"color": "#008080"}
-    })
-    chart.set_title({"name": "Altman Z-Score Trend Over Years"})
-    chart.set_x_axis({"name": "Year"})
-    chart.set_y_axis({"name": "Z-Score"})
-    chart.set_style(10)
-
-    # Insert chart next to the table
-    worksheet.insert_chart("E2", chart)
+    write_z_sheet(writer, "Z_Score_Table", z_df)
 
 print(f"💾 Report saved as: {output_file}")
 
@@ -1,68 +1,58 @@
 # zscore_xgboost_shap.py
 import pandas as pd
-import numpy as np
-from sklearn.model_selection import GroupKFold, cross_val_score
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_percentage_error
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler
-from xgboost import XGBRegressor
-import shap
 import matplotlib.pyplot as plt
 import seaborn as sns
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from explain import explain, shap_plots
+from model_cv import cross_validate, fit_cached
+from model_search import run_search
+from preprocess import DEFAULT_SPEC, fit_transform_cached, split_frame
 
 # === Load Data ===
 file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
-df = pd.read_excel(file_path)
-
-# === Prepare Data ===
-drop_cols = ['Year', 'Company']
-df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
-
-y = df['Z_next']
-X = df.drop(columns=['Z_next'])
+df = read_excel_cached(file_path)
 
-# Handle missing values
-imputer = SimpleImputer(strategy='median')
-X = pd.DataFrame(imputer.fit_transform(X), columns=X.columns)
+# === Optional: hyperparameter search (company-grouped CV, early stopping) ===
+tuned = None
+if input("Tune hyperparameters first? (y/N): ").strip().lower() == "y":
+    tuned = run_search(df, os.path.dirname(os.path.abspath(file_path)), "xgb")
 
-# Scale
-scaler = StandardScaler()
-X_scaled = pd.DataFrame(scaler.fit_transform(X), columns=X.columns)
-
-# === Cross-validation (Group by company if available) ===
-if 'Company' in df.columns:
-    groups = df['Company']
-else:
-    groups = np.arange(len(df))
-
-gkf = GroupKFold(n_splits=5)
+# === Prepare Data ===
+# groups = Company (taken before it is dropped from the features)
+X, y, groups = split_frame(df)
 
-model = XGBRegressor(
+xgb_params = dict(
     n_estimators=400,
     learning_rate=0.05,
     max_depth=6,
     subsample=0.8,
     colsample_bytree=0.8,
     random_state=42
-)
+) if tuned is None else tuned
 
-scores = cross_val_score(model, X_scaled, y, cv=gkf, groups=groups, scoring='r2')
+# === Cross-validation (grouped by company) ===
+# imputer + scaler are fitted inside each fold; folds run in parallel, results are cached on disk
+scores = cross_validate(X, y, groups, xgb_params, n_splits=5, preprocess=DEFAULT_SPEC)
 print(f"\nCross-validated R²: {scores.mean():.3f} ± {scores.std():.3f}")
 
-# === Fit Final Model ===
-model.fit(X_scaled, y)
+# === Fit Final Model (preprocessing fitted on all rows) ===
+prep, X_scaled, _ = fit_transform_cached(X, spec=DEFAULT_SPEC)
+model = fit_cached(X_scaled, y, xgb_params)
 
 # === SHAP Explainability ===
-explainer = shap.Explainer(model, X_scaled)
-shap_values = explainer(X_scaled)
+# tree-specific SHAP with a 100-row background sample, cached next to the model
+shap_values = explain(model, X_scaled, background_size=100)
 
-# Summary plot
-shap.summary_plot(shap_values, X_scaled, plot_type="bar")
-shap.summary_plot(shap_values, X_scaled)
+# Summary plots
+shap_plots(shap_values)
 
 # Feature importance (XGBoost native)
 importance = model.feature_importances_
-imp_df = pd.DataFrame({'Feature': X.columns, 'Importance': importance}).sort_values('Importance', ascending=False)
+imp_df = pd.DataFrame({'Feature': X_scaled.columns, 'Importance': importance}).sort_values('Importance', ascending=False)
 
 plt.figure(figsize=(10,6))
 sns.barplot(x='Importance', y='Feature', data=imp_df.head(15))
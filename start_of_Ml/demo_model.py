@@ -1,45 +1,38 @@
 # zscore_model_train.py
 import pandas as pd
-import numpy as np
 from sklearn.model_selection import train_test_split, GroupKFold
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_percentage_error
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import Pipeline
-from sklearn.impute import SimpleImputer
+from sklearn.metrics import r2_score, mean_absolute_percentage_error
 import matplotlib.pyplot as plt
 import seaborn as sns
+import os
+import sys
 
-# --- STEP 1: Load Data ---
-file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
-df = pd.read_excel(file_path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from model_search import run_search
+from preprocess import fit_transform_cached, split_frame
 
-# --- STEP 2: Clean Data ---
-# drop columns not used for modeling
-drop_cols = ['Year', 'Company']
-df = df.drop(columns=drop_cols, errors='ignore')
+# imputation + scaling; columns missing in 70% or more of the training rows are dropped first
+PREPROCESS = {"max_missing": 0.7}
 
-# target variable
-y = df['Z_next']
-X = df.drop(columns=['Z_next'])
-
-# optional: drop columns with extremely high missing rate (>70%)
-missing_ratio = X.isna().mean()
-X = X.loc[:, missing_ratio < 0.7]
+# --- STEP 1: Load Data ---
+file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
+df = read_excel_cached(file_path)
 
-# --- STEP 3: Imputation + Scaling Pipeline ---
-preprocess = Pipeline([
-    ('imputer', SimpleImputer(strategy='median')),
-    ('scaler', StandardScaler())
-])
+# optional: hyperparameter search (company-grouped CV, successive halving)
+tuned = None
+if input("Tune hyperparameters first? (y/N): ").strip().lower() == "y":
+    # tuned on the same preprocessing the model below is trained with
+    tuned = run_search(df, os.path.dirname(os.path.abspath(file_path)), "rf", preprocess=PREPROCESS)
 
-# --- STEP 4: Split Data ---
-# Group by company if available, else random
-if 'Year_num' in df.columns:
-    df['Year_num'] = pd.to_numeric(df['Year_num'], errors='coerce')
+# --- STEP 2: Clean Data ---
+# target, features and company groups (Company is taken before it is dropped)
+X, y, groups = split_frame(df)
 
+# --- STEP 3: Split Data ---
+# Group by company if available (first GroupKFold fold), else random
 if 'Company' in df.columns:
-    groups = df['Company']
     gkf = GroupKFold(n_splits=5)
     splits = list(gkf.split(X, y, groups=groups))
     train_idx, test_idx = splits[0]  # first fold
@@ -48,21 +41,19 @@ if 'Company' in df.columns:
 else:
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
+# --- STEP 4: Imputation + Scaling (fitted on the training rows only, cached) ---
+prep, X_train_t, X_test_t = fit_transform_cached(X_train, X_test, PREPROCESS)
+
 # --- STEP 5: Train Model ---
 model = RandomForestRegressor(
     n_estimators=300,
     max_depth=10,
     random_state=42,
     n_jobs=-1
-)
-
-pipe = Pipeline([
-    ('prep', preprocess),
-    ('model', model)
-])
+) if tuned is None else RandomForestRegressor(**tuned, n_jobs=-1)
 
-pipe.fit(X_train, y_train)
-y_pred = pipe.predict(X_test)
+model.fit(X_train_t, y_train)
+y_pred = model.predict(X_test_t)
 
 # --- STEP 6: Evaluation ---
 r2 = r2_score(y_test, y_pred)
@@ -75,9 +66,8 @@ print(f"R² Score: {r2:.3f}")
 print(f"MAPE: {mape:.2%}")
 
 # --- STEP 7: Feature Importance ---
-model_fitted = pipe.named_steps['model']
-importances = model_fitted.feature_importances_
-features = X.columns
+importances = model.feature_importances_
+features = X_train_t.columns
 
 imp_df = pd.DataFrame({'Feature': features, 'Importance': importances})
 imp_df = imp_df.sort_values('Importance', ascending=False)
@@ -3,115 +3,141 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.model_selection import GroupKFold, train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split
 from sklearn.metrics import (
     r2_score, mean_squared_error, mean_absolute_error, mean_absolute_percentage_error
 )
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler
-from xgboost import XGBRegressor
-import shap
-
-# === Load Data ===
-file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
-df = pd.read_excel(file_path)
-
-print(f"\n✅ Data Loaded. Shape: {df.shape}")
-
-# === Prepare Data ===
-drop_cols = ['Year', 'Company']
-df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
-
-# Target & Features
-y = df['Z_next']
-X = df.drop(columns=['Z_next'])
-
-# === Handle missing values ===
-imputer = SimpleImputer(strategy='median')
-X_imputed = pd.DataFrame(imputer.fit_transform(X), columns=X.columns)
-
-# === Scale features ===
-scaler = StandardScaler()
-X_scaled = pd.DataFrame(scaler.fit_transform(X_imputed), columns=X.columns)
-
-# === Train/Test Split ===
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-# === Define model ===
-model = XGBRegressor(
-    n_estimators=400,
-    learning_rate=0.05,
-    max_depth=6,
-    subsample=0.8,
-    colsample_bytree=0.8,
-    random_state=42,
-    objective='reg:squarederror'
-)
-
-# === Cross-validation ===
-gkf = GroupKFold(n_splits=5) if 'Company' in df.columns else None
-if gkf:
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
+from explain import explain, shap_plots
+from model_cv import cross_validate, fit_cached
+from model_search import run_search
+from model_store import save_bundle
+from preprocess import DEFAULT_SPEC, fit_transform_cached, split_frame
+
+
+# === Show or save the current figure ===
+def finish_plot(name, plot_dir=None):
+    """plt.show() interactively; with plot_dir, save <name>.png there instead (headless runs)."""
+    if plot_dir is None:
+        plt.show()
+        return
+    os.makedirs(plot_dir, exist_ok=True)
+    plt.savefig(os.path.join(plot_dir, f"{name}.png"), dpi=150, bbox_inches="tight")
+    plt.close()
+
+
+def run_train(df, plot_dir=None, params=None, shap_background=100, model_dir=None):
+    """Cross-validate, fit and evaluate the Z_next model on an ML-ready frame; returns the metrics.
+
+    params: XGBRegressor arguments (e.g. model_search's best_params_xgb.json) instead of the defaults.
+    shap_background: training rows sampled as the SHAP background (0: path-dependent, no background).
+    model_dir: model store where the fitted preprocessing and booster are saved as a new version.
+    """
+    # === Prepare Data ===
+    # Target, features and CV groups (Company, taken before it is dropped)
+    X, y, groups = split_frame(df)
+
+    # === Train/Test Split ===
+    X_train_raw, X_test_raw, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # === Impute + scale, fitted on the training rows only (cached) ===
+    prep, X_train, X_test = fit_transform_cached(X_train_raw, X_test_raw, DEFAULT_SPEC)
+
+    # === Define model ===
+    xgb_params = dict(
+        n_estimators=400,
+        learning_rate=0.05,
+        max_depth=6,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        random_state=42,
+        objective='reg:squarederror'
+    ) if params is None else dict(params)
+
+    # === Cross-validation ===
+    # grouped by company; imputer + scaler are fitted inside each fold, folds run in parallel (cached)
     print("\n🔁 Performing Group K-Fold cross-validation...")
-    groups = df['Company'] if 'Company' in df.columns else np.arange(len(df))
-    cv_scores = cross_val_score(model, X_scaled, y, cv=gkf, groups=groups, scoring='r2')
+    cv_scores = cross_validate(X, y, groups, xgb_params, n_splits=5, preprocess=DEFAULT_SPEC)
     print(f"R² (Cross-validated): {cv_scores.mean():.4f} ± {cv_scores.std():.4f}")
 
-# === Fit Model ===
-model.fit(X_train, y_train)
-y_pred = model.predict(X_test)
-
-# === Evaluation Metrics ===
-r2 = r2_score(y_test, y_pred)
-adj_r2 = 1 - (1 - r2) * (len(y_test) - 1) / (len(y_test) - X_test.shape[1] - 1)
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-mae = mean_absolute_error(y_test, y_pred)
-mape = mean_absolute_percentage_error(y_test, y_pred) * 100
-
-print("\n📊 Model Evaluation Results:")
-print(f"R² Score: {r2:.4f}")
-print(f"Adjusted R²: {adj_r2:.4f}")
-print(f"RMSE: {rmse:.4f}")
-print(f"MAE: {mae:.4f}")
-print(f"MAPE: {mape:.2f}%")
-
-# === Visualization: Actual vs Predicted ===
-plt.figure(figsize=(7,6))
-sns.scatterplot(x=y_test, y=y_pred, alpha=0.7)
-plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label="Perfect Prediction")
-plt.xlabel("Actual Z_next")
-plt.ylabel("Predicted Z_next")
-plt.title("Actual vs Predicted Z_next")
-plt.legend()
-plt.show()
-
-# === Residual Plot ===
-residuals = y_test - y_pred
-plt.figure(figsize=(7,5))
-sns.histplot(residuals, bins=30, kde=True)
-plt.title("Residuals Distribution")
-plt.xlabel("Residual (Actual - Predicted)")
-plt.show()
-
-# === Feature Importance ===
-importance = model.feature_importances_
-imp_df = pd.DataFrame({'Feature': X.columns, 'Importance': importance}).sort_values('Importance', ascending=False)
-
-plt.figure(figsize=(10,6))
-sns.barplot(x='Importance', y='Feature', data=imp_df.head(15))
-plt.title("Top 15 Important Features (XGBoost)")
-plt.show()
-
-# === SHAP Explainability ===
-print("\n🔍 Computing SHAP values (this may take a bit)...")
-explainer = shap.Explainer(model, X_train)
-shap_values = explainer(X_test)
-
-shap.summary_plot(shap_values, X_test, plot_type="bar", show=False)
-plt.title("SHAP Feature Importance (mean absolute value)")
-plt.show()
-
-shap.summary_plot(shap_values, X_test, show=False)
-plt.title("SHAP Summary Plot")
-plt.show()
-
-print("\n✅ Full evaluation completed successfully!")
+    # === Fit Model (reused from the cache when nothing changed) ===
+    model = fit_cached(X_train, y_train, xgb_params)
+    y_pred = model.predict(X_test)
+
+    # === Evaluation Metrics ===
+    r2 = r2_score(y_test, y_pred)
+    adj_r2 = 1 - (1 - r2) * (len(y_test) - 1) / (len(y_test) - X_test.shape[1] - 1)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    mae = mean_absolute_error(y_test, y_pred)
+    mape = mean_absolute_percentage_error(y_test, y_pred) * 100
+
+    print("\n📊 Model Evaluation Results:")
+    print(f"R² Score: {r2:.4f}")
+    print(f"Adjusted R²: {adj_r2:.4f}")
+    print(f"RMSE: {rmse:.4f}")
+    print(f"MAE: {mae:.4f}")
+    print(f"MAPE: {mape:.2f}%")
+
+    # === Visualization: Actual vs Predicted ===
+    plt.figure(figsize=(7,6))
+    sns.scatterplot(x=y_test, y=y_pred, alpha=0.7)
+    plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label="Perfect Prediction")
+    plt.xlabel("Actual Z_next")
+    plt.ylabel("Predicted Z_next")
+    plt.title("Actual vs Predicted Z_next")
+    plt.legend()
+    finish_plot("actual_vs_predicted", plot_dir)
+
+    # === Residual Plot ===
+    residuals = y_test - y_pred
+    plt.figure(figsize=(7,5))
+    sns.histplot(residuals, bins=30, kde=True)
+    plt.title("Residuals Distribution")
+    plt.xlabel("Residual (Actual - Predicted)")
+    finish_plot("residuals", plot_dir)
+
+    # === Feature Importance ===
+    importance = model.feature_importances_
+    imp_df = pd.DataFrame({'Feature': X_train.columns, 'Importance': importance}).sort_values('Importance', ascending=False)
+
+    plt.figure(figsize=(10,6))
+    sns.barplot(x='Importance', y='Feature', data=imp_df.head(15))
+    plt.title("Top 15 Important Features (XGBoost)")
+    finish_plot("feature_importance", plot_dir)
+
+    # === SHAP Explainability ===
+    # tree-specific SHAP on a sampled background (0 = XGBoost's own TreeSHAP), cached with the model
+    print("\n🔍 Computing SHAP values...")
+    shap_values = explain(model, X_test, background=X_train, background_size=shap_background)
+    shap_plots(shap_values, plot_dir)
+
+    metrics = {"R2": r2, "Adjusted_R2": adj_r2, "RMSE": rmse, "MAE": mae, "MAPE": mape}
+
+    # === Save the model bundle (preprocessing + booster) for scoring without retraining ===
+    if model_dir:
+        bundle = save_bundle(model_dir, prep, model, X.columns,
+                             {"params": xgb_params, "preprocess": DEFAULT_SPEC, "metrics": metrics, "rows": len(df)})
+        print(f"📦 Model bundle: {bundle}")
+
+    print("\n✅ Full evaluation completed successfully!")
+    return metrics
+
+
+def main():
+    # === Load Data ===
+    file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
+    df = read_excel_cached(file_path)
+
+    print(f"\n✅ Data Loaded. Shape: {df.shape}")
+    params = None
+    if input("Tune hyperparameters first? (y/N): ").strip().lower() == "y":
+        params = run_search(df, os.path.dirname(os.path.abspath(file_path)), "xgb")
+    run_train(df, params=params, model_dir=os.path.join(os.path.dirname(os.path.abspath(file_path)), "models"))
+
+
+if __name__ == "__main__":
+    main()
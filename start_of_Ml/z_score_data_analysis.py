@@ -4,10 +4,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import skew, kurtosis
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_full"))
+from excel_cache import read_excel_cached
 
 # === Load Data ===
 file_path = input("Enter the Excel file name (e.g., Cleaned_Features_WithZ_ML_ready.xlsx): ").strip()
-df = pd.read_excel(file_path)
+df = read_excel_cached(file_path)
 
 print("\n✅ Data Loaded Successfully!")
 print(f"Shape: {df.shape}")